@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,6 +53,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.ProfilerMiddleware",
+    "core.middleware.SlowQueryViewMiddleware",
 ]
 
 ROOT_URLCONF = "app.urls"
@@ -89,6 +92,77 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# Local memory per process by default, set CACHE_BACKEND & CACHE_LOCATION to
+# a shared cache (e.g. memcached) so invalidation reaches every worker
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+if os.environ.get("CACHE_LOCATION"):
+    CACHES["default"] = {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.memcached.MemcachedCache",
+        ),
+        "LOCATION": os.environ["CACHE_LOCATION"],
+        "TIMEOUT": 300,
+    }
+
+# Token authentication caches: a short lived copy per process in front of
+# the shared cache, so deactivations reach other workers within seconds
+
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_LOCAL_CACHE_TTL = 5
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+
+# Token lifetimes in seconds, refresh tokens trade for new access tokens
+# without re-checking the password
+
+AUTH_ACCESS_TOKEN_TTL = 60 * 60
+AUTH_REFRESH_TOKEN_TTL = 60 * 60 * 24 * 30
+
+# Request metrics served at /metrics, per process unless METRICS_DIR names a
+# directory shared by every worker (empty it when the workers restart).
+# Set METRICS_TOKEN to require "Authorization: Bearer <token>" to scrape,
+# without one only staff signed in to the admin may read them
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# cProfile dumps with a query log & top functions summary are written to
+# PROFILE_DIR, keeping the newest PROFILE_KEEP. Staff get one by sending an
+# X-Profile header, other requests are sampled and kept when slow
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_SECONDS = 1.0
+PROFILE_KEEP = 200
+PROFILE_TOP = 40
+
+# Queries slower than SLOW_QUERY_SECONDS (None, or an empty or "off"
+# environment variable, to disable) are logged with their plan, once per
+# SLOW_QUERY_INTERVAL seconds for each normalized SQL fingerprint, and
+# appended to SLOW_QUERY_LOG for the slow_queries command
+
+SLOW_QUERY_SECONDS = os.environ.get("SLOW_QUERY_SECONDS", "0.5").strip()
+SLOW_QUERY_SECONDS = (
+    None
+    if SLOW_QUERY_SECONDS.lower() in ("", "off", "none")
+    else float(SLOW_QUERY_SECONDS)
+)
+SLOW_QUERY_INTERVAL = 60
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -129,6 +203,14 @@ STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 
 MEDIA_ROOT = "/vol/web/media"
+DEFAULT_FILE_STORAGE = "core.storage.ContentAddressedStorage"
 STATIC_ROOT = "/vol/web/static"
 
 AUTH_USER_MODEL = "core.User"
+
+# Recipe image uploads are checked against these limits from the header
+# alone, then resized by a pool of worker processes
+
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+RECIPE_IMAGE_WORKERS = 2
@@ -0,0 +1,264 @@
+import http.client
+import json
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.test.client import MULTIPART_CONTENT, encode_multipart
+
+BOUNDARY = "BenchmarkBoundary"
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+# metrics where a higher value is a regression, the rest regress lower
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms", "queries_mean")
+
+
+class Request:
+    """One HTTP request of a benchmark scenario"""
+
+    def __init__(
+        self,
+        method,
+        path,
+        data=None,
+        token=None,
+        multipart=False,
+        ndjson=False,
+    ):
+        self.method = method
+        self.path = path
+        self.token = token
+        self.query = ""
+        self.body = b""
+        self.content_type = "application/json"
+        if method == "GET":
+            self.query = urlencode(data or {}, doseq=True)
+        elif multipart:
+            self.body = encode_multipart(BOUNDARY, data)
+            self.content_type = MULTIPART_CONTENT
+        elif ndjson:
+            # one JSON document per line of a list of objects
+            lines = "".join(json.dumps(item) + "\n" for item in data)
+            self.body = lines.encode()
+            self.content_type = "application/x-ndjson"
+        elif data is not None:
+            self.body = json.dumps(data).encode()
+
+    @property
+    def url(self):
+        return f"{self.path}?{self.query}" if self.query else self.path
+
+    def headers(self):
+        headers = {"Content-Type": self.content_type}
+        if self.token:
+            headers["Authorization"] = f"Token {self.token}"
+        return headers
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries it lets through"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def allowed_host():
+    """Return a host name the site accepts, localhost when in doubt"""
+    for host in settings.ALLOWED_HOSTS:
+        if "*" not in host:
+            return host.lstrip(".")
+    return "localhost"
+
+
+class ClientTransport:
+    """Send requests through Django's test client, in this process"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.host = allowed_host()
+
+    def send(self, request):
+        """Return the status code & number of queries a request ran"""
+        if not hasattr(self.local, "client"):
+            self.local.client = Client(HTTP_HOST=self.host)
+        extra = {}
+        if request.token:
+            extra["HTTP_AUTHORIZATION"] = f"Token {request.token}"
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.local.client.generic(
+                request.method,
+                request.url,
+                request.body,
+                content_type=request.content_type,
+                **extra,
+            )
+            if response.streaming:
+                # streamed bodies run their queries as they are read
+                b"".join(response.streaming_content)
+        return response.status_code, counter.count
+
+    def close(self):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def counting_application(application):
+    """Wrap a WSGI app to report its query count in a response header"""
+
+    def app(environ, start_response):
+        counter = QueryCounter()
+
+        def counted_start_response(status, headers, exc_info=None):
+            headers = headers + [(QUERY_COUNT_HEADER, str(counter.count))]
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(counter):
+            return application(environ, counted_start_response)
+
+    return app
+
+
+class ServerTransport:
+    """Send requests over HTTP to a local threaded WSGI server"""
+
+    def __init__(self):
+        self.server = make_server(
+            "127.0.0.1",
+            0,
+            counting_application(WSGIHandler()),
+            server_class=ThreadingWSGIServer,
+            handler_class=QuietHandler,
+        )
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+
+    def send(self, request):
+        """Return the status code & number of queries a request ran"""
+        conn = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            conn.request(
+                request.method,
+                request.url,
+                body=request.body or None,
+                headers=request.headers(),
+            )
+            response = conn.getresponse()
+            response.read()
+            return (
+                response.status,
+                int(response.getheader(QUERY_COUNT_HEADER, 0)),
+            )
+        finally:
+            conn.close()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(samples, percent):
+    """Return the nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_kb():
+    """Return this process's peak resident set size in kilobytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_scenario(transport, prepare, expect, requests, concurrency, warmup):
+    """Send requests built by prepare() & summarize their latency
+
+    prepare() runs untimed before each request, so it may create the
+    rows a request needs. Each worker thread uses its own connection.
+    """
+    for _ in range(warmup):
+        transport.send(prepare())
+
+    def worker(count):
+        samples, errors = [], 0
+        try:
+            for _ in range(count):
+                request = prepare()
+                start = time.perf_counter()
+                status, queries = transport.send(request)
+                samples.append((time.perf_counter() - start, queries))
+                errors += status != expect
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+        return samples, errors
+
+    shares = [
+        requests // concurrency + (n < requests % concurrency)
+        for n in range(concurrency)
+    ]
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = [worker(requests)]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(worker, shares))
+    elapsed = time.perf_counter() - started
+
+    latencies = [s[0] * 1000 for samples, _ in results for s in samples]
+    queries = [s[1] for samples, _ in results for s in samples]
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "queries_mean": round(sum(queries) / len(queries), 2),
+        "queries_max": max(queries),
+    }
+
+
+def compare(baseline, results, tolerance):
+    """Return (scenario, metric, before, after) for each regression
+
+    Every metric may drift by the tolerance, a fraction of the baseline
+    value: even query counts vary with cache hits across samples.
+    """
+    regressions = []
+    for name, after in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric in (*HIGHER_IS_WORSE, "rps"):
+            if metric in HIGHER_IS_WORSE:
+                worse = after[metric] > before[metric] * (1 + tolerance)
+            else:
+                worse = after[metric] < before[metric] * (1 - tolerance)
+            if worse:
+                regressions.append(
+                    (name, metric, before[metric], after[metric])
+                )
+    return regressions
@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+DATA_VERSION_KEY = "data-version:{}"
+
+
+def _new_version():
+    # time based, so a version evicted from the cache is never handed out again
+    return int(time.time() * 1000000)
+
+
+def get_data_version(user_id):
+    """Return the current version of a user's recipe data"""
+    return cache.get_or_set(
+        DATA_VERSION_KEY.format(user_id), _new_version, timeout=None
+    )
+
+
+def _incr_data_version(user_id):
+    key = DATA_VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def bump_data_version(user_id):
+    """Invalidate everything cached for a user's recipe data"""
+    _incr_data_version(user_id)
+    # bump again once committed so a read racing the transaction
+    # can't keep stale data cached under the new version
+    transaction.on_commit(lambda: _incr_data_version(user_id))
@@ -0,0 +1,530 @@
+import io
+import json
+import random
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import URLPattern, get_resolver, reverse
+from PIL import Image
+
+from core import benchmark
+from core.models import (
+    Ingredient,
+    Recipe,
+    RefreshToken,
+    SyncSequence,
+    Tag,
+)
+from user.authentication import issue_access_token
+
+PASSWORD = "password"
+
+
+def route_names():
+    """Return the namespaced name of every user & recipe API route"""
+    names = set()
+    for namespace in ("user", "recipe"):
+        _, resolver = get_resolver().namespace_dict[namespace]
+        stack = list(resolver.url_patterns)
+        while stack:
+            pattern = stack.pop()
+            if isinstance(pattern, URLPattern):
+                names.add(f"{namespace}:{pattern.name}")
+            else:
+                stack.extend(pattern.url_patterns)
+    return names
+
+
+def _jpeg():
+    image = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 120, 40)).save(image, format="JPEG")
+    image.seek(0)
+    image.name = "benchmark.jpg"
+    return image
+
+
+class Scenarios:
+    """Build the requests for each benchmarked route
+
+    Reads run as sampled seed_data users, writes as users created for
+    this run, which are deleted with everything they own afterwards.
+    """
+
+    def __init__(self, seed, sample_users):
+        self.rng = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.created = 0
+
+        User = get_user_model()
+        seeded = list(
+            User.objects.filter(email__startswith=f"seed{seed}-")
+            .exclude(recipe=None)
+            .values_list("id", flat=True)
+            .distinct()
+        )
+        if not seeded:
+            raise CommandError(f"No recipes were seeded with seed {seed}.")
+        self.readers = []
+        for user in User.objects.filter(
+            id__in=self.rng.sample(seeded, min(sample_users, len(seeded)))
+        ).order_by("id"):
+            recipes = Recipe.objects.filter(user=user)
+            self.readers.append(
+                {
+                    "token": issue_access_token(user).key,
+                    "recipes": list(recipes.values_list("id", flat=True)),
+                    "tags": list(
+                        Tag.objects.filter(user=user).values_list(
+                            "id", flat=True
+                        )
+                    ),
+                    "words": [
+                        title.split()[-1]
+                        for title in recipes.values_list("title", flat=True)[
+                            :20
+                        ]
+                    ],
+                    "sequence": SyncSequence.objects.current_value(user.pk),
+                }
+            )
+
+        self.writer = User.objects.create_user(self.email(), PASSWORD)
+        self.writer_token = issue_access_token(self.writer).key
+        self.writer_tags = [
+            Tag.objects.create(user=self.writer, name=f"Tag {n}").id
+            for n in range(5)
+        ]
+        self.writer_ingredients = [
+            Ingredient.objects.create(user=self.writer, name=f"Ing {n}").id
+            for n in range(10)
+        ]
+
+    def email(self):
+        self.created += 1
+        return f"benchmark-{self.run_id}-{self.created}@example.com"
+
+    def cleanup(self):
+        """Delete the users created for this run & all they own"""
+        get_user_model().objects.filter(
+            email__startswith=f"benchmark-{self.run_id}-"
+        ).delete()
+
+    def reader(self):
+        return self.rng.choice(self.readers)
+
+    def recipe_payload(self, n):
+        return {
+            "title": f"Benchmark recipe {n}",
+            "time_minutes": 30,
+            "price": "12.50",
+            "tags": self.rng.sample(self.writer_tags, 2),
+            "ingredients": self.rng.sample(self.writer_ingredients, 5),
+        }
+
+    def writer_recipe(self):
+        return Recipe.objects.create(
+            user=self.writer, title="Benchmark", time_minutes=5, price=1
+        ).id
+
+    def all(self):
+        """Return {name: (route name, expected status, prepare)}"""
+        Request = benchmark.Request
+        url = reverse
+
+        def get(route, params=None, args=None):
+            """Build GETs as a random reader, passing it to the callables"""
+
+            def prepare():
+                reader = self.reader()
+                return Request(
+                    "GET",
+                    url(route, args=args(reader) if args else None),
+                    params(reader) if callable(params) else params,
+                    reader["token"],
+                )
+
+            return prepare
+
+        def detail_args(reader):
+            return [self.rng.choice(reader["recipes"])]
+
+        def some_ids(reader):
+            recipes = reader["recipes"]
+            return self.rng.sample(recipes, min(len(recipes), 20))
+
+        def ids_param(reader):
+            return {"ids": ",".join(map(str, some_ids(reader)))}
+
+        def batch_get():
+            reader = self.reader()
+            return Request(
+                "POST",
+                url("recipe:recipe-batch-get"),
+                {"ids": some_ids(reader)},
+                reader["token"],
+            )
+
+        def filtered(reader):
+            tags = ",".join(map(str, reader["tags"][:2]))
+            return {"tags": tags, "max_price": 20}
+
+        def recent_changes(reader):
+            return {"since": max(reader["sequence"] - 100, 0)}
+
+        def search(reader):
+            return {"search": self.rng.choice(reader["words"])}
+
+        def unique_names(count):
+            return [uuid.uuid4().hex[:12] for _ in range(count)]
+
+        return {
+            "user-create": (
+                "user:create",
+                201,
+                lambda: Request(
+                    "POST",
+                    url("user:create"),
+                    {
+                        "email": self.email(),
+                        "password": PASSWORD,
+                        "name": "Benchmark",
+                    },
+                ),
+            ),
+            "user-token": (
+                "user:token",
+                200,
+                lambda: Request(
+                    "POST",
+                    url("user:token"),
+                    {"email": self.writer.email, "password": PASSWORD},
+                ),
+            ),
+            "user-token-refresh": (
+                "user:token-refresh",
+                200,
+                lambda: Request(
+                    "POST",
+                    url("user:token-refresh"),
+                    {
+                        "refresh": RefreshToken.objects.create(
+                            user=self.writer
+                        ).key
+                    },
+                ),
+            ),
+            "user-me": ("user:me", 200, get("user:me")),
+            "user-me-update": (
+                "user:me",
+                200,
+                lambda: Request(
+                    "PATCH",
+                    url("user:me"),
+                    {"name": unique_names(1)[0]},
+                    self.writer_token,
+                ),
+            ),
+            "api-root": ("recipe:api-root", 200, get("recipe:api-root")),
+            "tag-list": ("recipe:tag-list", 200, get("recipe:tag-list")),
+            "tag-list-assigned": (
+                "recipe:tag-list",
+                200,
+                get("recipe:tag-list", {"assigned_only": 1}),
+            ),
+            "tag-create": (
+                "recipe:tag-list",
+                201,
+                lambda: Request(
+                    "POST",
+                    url("recipe:tag-list"),
+                    {"name": unique_names(1)[0]},
+                    self.writer_token,
+                ),
+            ),
+            "tag-bulk": (
+                "recipe:tag-bulk-get-or-create",
+                200,
+                lambda: Request(
+                    "POST",
+                    url("recipe:tag-bulk-get-or-create"),
+                    {"names": unique_names(10)},
+                    self.writer_token,
+                ),
+            ),
+            "ingredient-list": (
+                "recipe:ingredient-list",
+                200,
+                get("recipe:ingredient-list"),
+            ),
+            "ingredient-create": (
+                "recipe:ingredient-list",
+                201,
+                lambda: Request(
+                    "POST",
+                    url("recipe:ingredient-list"),
+                    {"name": unique_names(1)[0]},
+                    self.writer_token,
+                ),
+            ),
+            "ingredient-bulk": (
+                "recipe:ingredient-bulk-get-or-create",
+                200,
+                lambda: Request(
+                    "POST",
+                    url("recipe:ingredient-bulk-get-or-create"),
+                    {"names": unique_names(10)},
+                    self.writer_token,
+                ),
+            ),
+            "recipe-list": (
+                "recipe:recipe-list",
+                200,
+                get("recipe:recipe-list"),
+            ),
+            "recipe-list-filtered": (
+                "recipe:recipe-list",
+                200,
+                get("recipe:recipe-list", filtered),
+            ),
+            "recipe-list-sparse": (
+                "recipe:recipe-list",
+                200,
+                get(
+                    "recipe:recipe-list",
+                    {"fields": "id,title,tags", "expand": "tags"},
+                ),
+            ),
+            "recipe-list-ids": (
+                "recipe:recipe-list",
+                200,
+                get("recipe:recipe-list", ids_param),
+            ),
+            "recipe-search": (
+                "recipe:recipe-list",
+                200,
+                get("recipe:recipe-list", search),
+            ),
+            "changes": (
+                "recipe:changes",
+                200,
+                get("recipe:changes", recent_changes),
+            ),
+            "recipe-export": (
+                "recipe:recipe-export",
+                200,
+                get("recipe:recipe-export", {"format": "ndjson"}),
+            ),
+            "recipe-detail": (
+                "recipe:recipe-detail",
+                200,
+                get("recipe:recipe-detail", args=detail_args),
+            ),
+            "recipe-batch-get": ("recipe:recipe-batch-get", 200, batch_get),
+            "recipe-create": (
+                "recipe:recipe-list",
+                201,
+                lambda: Request(
+                    "POST",
+                    url("recipe:recipe-list"),
+                    self.recipe_payload(0),
+                    self.writer_token,
+                ),
+            ),
+            "recipe-update": (
+                "recipe:recipe-detail",
+                200,
+                lambda: Request(
+                    "PATCH",
+                    url("recipe:recipe-detail", args=[self.writer_recipe()]),
+                    {"title": "Updated", "tags": self.writer_tags[:1]},
+                    self.writer_token,
+                ),
+            ),
+            "recipe-delete": (
+                "recipe:recipe-detail",
+                204,
+                lambda: Request(
+                    "DELETE",
+                    url("recipe:recipe-detail", args=[self.writer_recipe()]),
+                    token=self.writer_token,
+                ),
+            ),
+            "recipe-bulk": (
+                "recipe:recipe-bulk-create",
+                201,
+                lambda: Request(
+                    "POST",
+                    url("recipe:recipe-bulk-create"),
+                    [self.recipe_payload(n) for n in range(20)],
+                    self.writer_token,
+                ),
+            ),
+            "recipe-import": (
+                "recipe:recipe-import",
+                200,
+                lambda: Request(
+                    "POST",
+                    url("recipe:recipe-import"),
+                    [
+                        dict(
+                            self.recipe_payload(n),
+                            tags=["Benchmark", *unique_names(1)],
+                            ingredients=[f"Spice {n % 10}"],
+                        )
+                        for n in range(200)
+                    ],
+                    self.writer_token,
+                    ndjson=True,
+                ),
+            ),
+            "recipe-upload-image": (
+                "recipe:recipe-upload-image",
+                200,
+                lambda: Request(
+                    "POST",
+                    url(
+                        "recipe:recipe-upload-image",
+                        args=[self.writer_recipe()],
+                    ),
+                    {"image": _jpeg()},
+                    self.writer_token,
+                    multipart=True,
+                ),
+            ),
+        }
+
+
+class Command(BaseCommand):
+    """Django command benchmarking every API route against seeded data"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode", choices=("client", "server"), default="client"
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--users", type=int, default=1000, help="seed_data users"
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=10000, help="seed_data recipes"
+        )
+        parser.add_argument("--sample-users", type=int, default=20)
+        parser.add_argument(
+            "--only", nargs="+", default=None, metavar="SCENARIO"
+        )
+        parser.add_argument(
+            "--cold-cache",
+            action="store_true",
+            help="clear the cache before every request",
+        )
+        parser.add_argument("--output", help="write results to this JSON file")
+        parser.add_argument("--baseline", help="JSON results to compare to")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="allowed timing regression as a fraction of the baseline",
+        )
+
+    def handle(self, *args, **options):
+        if (
+            not get_user_model()
+            .objects.filter(email__startswith=f"seed{options['seed']}-")
+            .exists()
+        ):
+            call_command(
+                "seed_data",
+                users=options["users"],
+                recipes=options["recipes"],
+                seed=options["seed"],
+                password=PASSWORD,
+                stdout=self.stdout,
+            )
+
+        scenarios = Scenarios(options["seed"], options["sample_users"])
+        routes = scenarios.all()
+        uncovered = route_names() - {route for route, _, _ in routes.values()}
+        if uncovered:
+            self.stderr.write(
+                f"Routes without a scenario: {sorted(uncovered)}"
+            )
+        unknown = set(options["only"] or ()) - set(routes)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {sorted(unknown)}")
+
+        transport = (
+            benchmark.ServerTransport()
+            if options["mode"] == "server"
+            else benchmark.ClientTransport()
+        )
+        results = {
+            "mode": options["mode"],
+            "concurrency": options["concurrency"],
+            "scenarios": {},
+        }
+        self.stdout.write(
+            f"{'scenario':<22} {'n':>5} {'err':>4} {'p50 ms':>8} "
+            f"{'p95 ms':>8} {'p99 ms':>8} {'rps':>8} {'queries':>7}"
+        )
+        try:
+            for name, (_, expect, prepare) in routes.items():
+                if options["only"] and name not in options["only"]:
+                    continue
+                if options["cold_cache"]:
+                    prepare = self.clearing_cache(prepare)
+                stats = benchmark.run_scenario(
+                    transport,
+                    prepare,
+                    expect,
+                    options["requests"],
+                    options["concurrency"],
+                    options["warmup"],
+                )
+                results["scenarios"][name] = stats
+                self.stdout.write(
+                    f"{name:<22} {stats['requests']:>5} {stats['errors']:>4} "
+                    f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+                    f"{stats['p99_ms']:>8.1f} {stats['rps']:>8.1f} "
+                    f"{stats['queries_mean']:>7.1f}"
+                )
+        finally:
+            transport.close()
+            scenarios.cleanup()
+
+        results["peak_rss_kb"] = benchmark.peak_rss_kb()
+        self.stdout.write(f"Peak RSS: {results['peak_rss_kb']} kB")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = benchmark.compare(
+                    json.load(baseline), results, options["tolerance"]
+                )
+            for name, metric, before, after in regressions:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{name}: {metric} regressed {before} -> {after}"
+                    )
+                )
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} metrics regressed from the baseline"
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    @staticmethod
+    def clearing_cache(prepare):
+        def prepare_cold():
+            request = prepare()
+            cache.clear()
+            return request
+
+        return prepare_cold
@@ -0,0 +1,144 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from core.models import Ingredient, Recipe, Tag, normalize_name
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command timing recipe list serialization with & without
+    the values() read path, on throwaway rows that are rolled back"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, nargs="+", default=[1000, 10000, 100000]
+        )
+        parser.add_argument("--page-size", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = self.create_recipes(max(options["rows"]))
+            self.stdout.write(
+                f"{'rows':>8} {'model (s)':>10} {'values (s)':>11} "
+                f"{'speedup':>8}"
+            )
+            for count in options["rows"]:
+                # the n lowest IDs, so every size reads the same rows
+                queryset = recipes.filter(
+                    id__lte=recipes.values_list("id", flat=True)[count - 1]
+                )
+                model = self.best_of(
+                    options["repeat"],
+                    self.read_models,
+                    queryset,
+                    options["page_size"],
+                )
+                values = self.best_of(
+                    options["repeat"],
+                    self.read_values,
+                    queryset,
+                    options["page_size"],
+                )
+                self.stdout.write(
+                    f"{count:>8} {model:>10.3f} {values:>11.3f} "
+                    f"{model / values:>7.1f}x"
+                )
+            transaction.set_rollback(True)
+
+    def create_recipes(self, count):
+        """Insert count recipes with 3 tags & 3 ingredients each"""
+        user = get_user_model().objects.create_user(
+            "benchmark@localhost", None
+        )
+        for model, prefix, total in (
+            (Tag, "Tag", 20),
+            (Ingredient, "Ing", 50),
+        ):
+            model.objects.bulk_create(
+                model(
+                    user=user,
+                    name=f"{prefix} {n}",
+                    normalized_name=normalize_name(f"{prefix} {n}"),
+                )
+                for n in range(total)
+            )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    user=user,
+                    title=f"Recipe {n}",
+                    price="9.99",
+                    time_minutes=n % 120,
+                    search_text=f"Recipe {n}",
+                )
+                for n in range(count)
+            ),
+            batch_size=5000,
+        )
+        recipes = Recipe.objects.filter(user=user).order_by("id")
+
+        # tag & ingredient IDs are only known after the insert on SQLite
+        for name in ("tags", "ingredients"):
+            field = Recipe._meta.get_field(name)
+            ids = list(
+                field.related_model.objects.filter(user=user).values_list(
+                    "id", flat=True
+                )
+            )
+            through = field.remote_field.through
+            column = field.m2m_reverse_name()
+            through.objects.bulk_create(
+                (
+                    through(recipe_id=pk, **{column: ids[(n + k) % len(ids)]})
+                    for n, pk in enumerate(
+                        recipes.values_list("id", flat=True).iterator()
+                    )
+                    for k in range(3)
+                ),
+                batch_size=5000,
+            )
+        return recipes
+
+    def best_of(self, repeat, read, queryset, page_size):
+        """Return the fastest of repeat runs, in seconds"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            read(queryset, page_size)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def pages(self, queryset, page_size):
+        """Yield querysets over consecutive pages of primary keys"""
+        last = 0
+        while True:
+            page = queryset.filter(id__gt=last).order_by("id")[:page_size]
+            ids = list(page.values_list("id", flat=True))
+            if not ids:
+                return
+            yield queryset.filter(id__in=ids).order_by("id")
+            last = ids[-1]
+
+    def read_models(self, queryset, page_size):
+        """Serialize model instances, as RecipeSerializer always did"""
+        for page in self.pages(queryset, page_size):
+            RecipeSerializer(
+                page.prefetch_related(
+                    Prefetch("tags", queryset=Tag.objects.only("id")),
+                    Prefetch(
+                        "ingredients", queryset=Ingredient.objects.only("id")
+                    ),
+                ),
+                many=True,
+            ).data
+
+    def read_values(self, queryset, page_size):
+        """Serialize values() rows through the read path"""
+        serializer = RecipeSerializer()
+        for page in self.pages(queryset, page_size):
+            serializer.read_rows(serializer.read_queryset(page))
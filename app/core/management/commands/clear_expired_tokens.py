@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.models import RefreshToken
+
+
+class Command(BaseCommand):
+    """Django command to delete expired access & refresh tokens in batches"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        access_cutoff = now - timedelta(seconds=settings.AUTH_ACCESS_TOKEN_TTL)
+        deleted = {
+            "access": self.delete_in_batches(
+                Token.objects.filter(created__lte=access_cutoff),
+                options["batch_size"],
+            ),
+            "refresh": self.delete_in_batches(
+                RefreshToken.objects.filter(expires_at__lte=now),
+                options["batch_size"],
+            ),
+        }
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Deleted {access} access and {refresh} refresh tokens".format(
+                    **deleted
+                )
+            )
+        )
+
+    def delete_in_batches(self, queryset, batch_size):
+        """Delete matching rows a batch at a time to keep locks short"""
+        total = 0
+        while True:
+            keys = list(queryset.values_list("pk", flat=True)[:batch_size])
+            if not keys:
+                return total
+            queryset.model.objects.filter(pk__in=keys).delete()
+            total += len(keys)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command generating the missing variants of recipe images
+
+    Images stored before variants existed, or whose generation failed,
+    are resized in the worker pool. Complete sets are skipped.
+    """
+
+    def handle(self, *args, **options):
+        names = (
+            Recipe.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .order_by("image")
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        futures = [
+            future
+            for future in map(images.schedule_variants, names.iterator())
+            if future is not None
+        ]
+        failed = sum(1 for future in futures if future.exception())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated variants of {len(futures) - failed} images, "
+                f"{failed} failed"
+            )
+        )
@@ -0,0 +1,245 @@
+import re
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.benchmark import allowed_host
+from core.models import Recipe
+from core.slow_queries import fingerprint
+from user.authentication import issue_access_token
+
+# every cache misses, so each request runs all of its queries
+NO_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+
+
+class QueryCapture:
+    """Database execute wrapper keeping each query with its params"""
+
+    def __init__(self):
+        self.scenario = None
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.queries.append((self.scenario, sql, params))
+        return execute(sql, params, many, context)
+
+
+def _walk_postgresql(node):
+    """Yield (node type, table, index, estimated rows) of a JSON plan"""
+    yield (
+        node["Node Type"],
+        node.get("Relation Name"),
+        node.get("Index Name"),
+        node.get("Plan Rows"),
+    )
+    for child in node.get("Plans", ()):
+        yield from _walk_postgresql(child)
+
+
+def _walk_sqlite(rows):
+    """Yield (node type, table, index, None) of EXPLAIN QUERY PLAN rows"""
+    for row in rows:
+        detail = row[-1]
+        scan = re.match(r"(SCAN|SEARCH)(?: TABLE)? (\w+)", detail)
+        if scan is None:
+            continue
+        index = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+        if index:
+            kind = "Index Scan"
+        elif "USING" in detail or scan.group(1) == "SEARCH":
+            kind = "Primary Key Lookup"
+        else:
+            kind = "Seq Scan"
+        yield kind, scan.group(2), index and index.group(1), None
+
+
+def plan_nodes(sql, params):
+    """Return the scans in the plan of a query"""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            return list(_walk_postgresql(cursor.fetchone()[0][0]["Plan"]))
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return list(_walk_sqlite(cursor.fetchall()))
+
+
+class Command(BaseCommand):
+    """Django command replaying the API's reads to review their indexes"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--email",
+            help="user to replay requests as, the one with most recipes "
+            "by default",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("postgresql", "sqlite"):
+            raise CommandError("Only PostgreSQL & SQLite plans are read.")
+        users = get_user_model().objects.all()
+        if options["email"]:
+            users = users.filter(email__iexact=options["email"])
+        user = (
+            users.annotate(recipes=Count("recipe"))
+            .order_by("-recipes")
+            .first()
+        )
+        if user is None:
+            raise CommandError("No user to replay requests as.")
+
+        capture = QueryCapture()
+        # roll back the tokens & anything else requests write
+        with transaction.atomic():
+            with override_settings(CACHES=NO_CACHE):
+                self.replay(user, capture)
+            scans = self.explain(capture.queries)
+            transaction.set_rollback(True)
+
+        tables = {
+            model._meta.db_table
+            for model in apps.get_app_config("core").get_models(
+                include_auto_created=True
+            )
+        }
+        self.report_seq_scans(scans, tables)
+        self.report_unused_indexes(scans, tables)
+
+    def requests(self, user):
+        """Return (scenario, url name, args, params) of the API's reads"""
+        recipe = Recipe.objects.filter(user=user).order_by("id").first()
+        tags = list(user.tag_set.values_list("id", flat=True)[:2])
+        ingredients = list(
+            user.ingredient_set.values_list("id", flat=True)[:2]
+        )
+        word = recipe.title.split()[-1] if recipe else "soup"
+        reads = [
+            ("tag list", "recipe:tag-list", None, {}),
+            ("tags assigned", "recipe:tag-list", None, {"assigned_only": 1}),
+            ("ingredient list", "recipe:ingredient-list", None, {}),
+            (
+                "ingredients assigned",
+                "recipe:ingredient-list",
+                None,
+                {"assigned_only": 1},
+            ),
+            ("recipe list", "recipe:recipe-list", None, {}),
+            (
+                "recipes by tag",
+                "recipe:recipe-list",
+                None,
+                {"tags": ",".join(map(str, tags))},
+            ),
+            (
+                "recipes by ingredient",
+                "recipe:recipe-list",
+                None,
+                {"ingredients": ",".join(map(str, ingredients))},
+            ),
+            (
+                "recipes by price & time",
+                "recipe:recipe-list",
+                None,
+                {"min_price": 5, "max_price": 20, "max_time": 60},
+            ),
+            ("recipe search", "recipe:recipe-list", None, {"search": word}),
+            (
+                "recipe sparse fields",
+                "recipe:recipe-list",
+                None,
+                {"fields": "id,title,tags", "expand": "tags"},
+            ),
+            ("profile", "user:me", None, {}),
+        ]
+        if recipe:
+            reads.append(
+                ("recipe detail", "recipe:recipe-detail", [recipe.id], {})
+            )
+        return reads
+
+    def replay(self, user, capture):
+        """Send each read as the user, capturing the queries it runs"""
+        client = Client(HTTP_HOST=allowed_host())
+        token = issue_access_token(user).key
+        with connection.execute_wrapper(capture):
+            for scenario, name, args, params in self.requests(user):
+                capture.scenario = scenario
+                response = client.get(
+                    reverse(name, args=args),
+                    params,
+                    HTTP_AUTHORIZATION=f"Token {token}",
+                )
+                if response.status_code != 200:
+                    raise CommandError(
+                        f"{scenario} returned {response.status_code}"
+                    )
+
+    def explain(self, queries):
+        """Return (scenario, sql, plan nodes) of each distinct query"""
+        scans, seen = [], set()
+        for scenario, sql, params in queries:
+            key = fingerprint(sql)
+            if key in seen or sql.lstrip()[:6].upper() != "SELECT":
+                continue
+            seen.add(key)
+            scans.append((scenario, sql, plan_nodes(sql, params)))
+        return scans
+
+    def report_seq_scans(self, scans, tables):
+        self.stdout.write("Sequential scans of app tables:")
+        found = False
+        for scenario, sql, nodes in scans:
+            for kind, table, _, rows in nodes:
+                if kind != "Seq Scan" or table not in tables:
+                    continue
+                found = True
+                estimate = f", ~{rows} rows" if rows is not None else ""
+                self.stdout.write(f"  {table} in {scenario}{estimate}")
+                self.stdout.write(f"    {sql[:300]}")
+        if not found:
+            self.stdout.write("  none")
+
+    def report_unused_indexes(self, scans, tables):
+        """List non-unique indexes no replayed query used"""
+        used = {index for _, _, nodes in scans for _, _, index, _ in nodes}
+        usage = {}
+        if connection.vendor == "postgresql":
+            # scans since the statistics were reset, across all traffic
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT indexrelname, idx_scan FROM pg_stat_user_indexes"
+                )
+                usage = dict(cursor.fetchall())
+
+        self.stdout.write("Indexes unused by the replayed queries:")
+        found = False
+        with connection.cursor() as cursor:
+            for table in sorted(tables):
+                constraints = connection.introspection.get_constraints(
+                    cursor, table
+                )
+                for name, info in sorted(constraints.items()):
+                    if (
+                        not info["index"]
+                        or info["unique"]
+                        or info["primary_key"]
+                        or name in used
+                    ):
+                        continue
+                    found = True
+                    scanned = (
+                        f", {usage[name]} scans recorded"
+                        if name in usage
+                        else ""
+                    )
+                    columns = ", ".join(str(c) for c in info["columns"])
+                    self.stdout.write(f"  {table}.{name} ({columns}){scanned}")
+        if not found:
+            self.stdout.write("  none")
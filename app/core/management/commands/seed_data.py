@@ -0,0 +1,456 @@
+import io
+import random
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag, normalize_name
+
+TAG_WORDS = (
+    "vegan",
+    "vegetarian",
+    "quick",
+    "breakfast",
+    "lunch",
+    "dinner",
+    "dessert",
+    "snack",
+    "spicy",
+    "gluten free",
+    "dairy free",
+    "low carb",
+    "comfort food",
+    "party",
+    "summer",
+    "winter",
+    "budget",
+    "meal prep",
+    "one pot",
+    "grill",
+    "baking",
+    "healthy",
+    "kids",
+    "holiday",
+)
+INGREDIENT_WORDS = (
+    "chickpeas",
+    "lentils",
+    "rice",
+    "pasta",
+    "flour",
+    "sugar",
+    "butter",
+    "olive oil",
+    "garlic",
+    "onion",
+    "shallot",
+    "tomato",
+    "potato",
+    "carrot",
+    "celery",
+    "spinach",
+    "kale",
+    "broccoli",
+    "cauliflower",
+    "mushroom",
+    "bell pepper",
+    "chilli",
+    "ginger",
+    "lemon",
+    "lime",
+    "coconut milk",
+    "cream",
+    "milk",
+    "egg",
+    "cheddar",
+    "parmesan",
+    "feta",
+    "yoghurt",
+    "chicken",
+    "beef",
+    "pork",
+    "lamb",
+    "salmon",
+    "prawns",
+    "tofu",
+    "bacon",
+    "chorizo",
+    "basil",
+    "coriander",
+    "parsley",
+    "thyme",
+    "rosemary",
+    "cumin",
+    "paprika",
+    "turmeric",
+    "cinnamon",
+    "honey",
+    "soy sauce",
+    "vinegar",
+    "mustard",
+    "stock",
+    "beans",
+    "peas",
+    "corn",
+    "avocado",
+)
+TITLE_STYLES = (
+    "curry",
+    "stew",
+    "soup",
+    "salad",
+    "bake",
+    "pie",
+    "stir fry",
+    "risotto",
+    "tacos",
+    "roast",
+    "pasta",
+    "burger",
+    "traybake",
+    "casserole",
+    "bowl",
+)
+TITLE_ADJECTIVES = (
+    "Easy",
+    "Spicy",
+    "Creamy",
+    "Crispy",
+    "Smoky",
+    "Classic",
+    "Weeknight",
+    "Slow cooked",
+    "Lemony",
+    "Herby",
+    "Sticky",
+    "Rustic",
+)
+
+
+def _vocabulary(words, count):
+    """Return count distinct names, numbering words past the first pass"""
+    names = []
+    for n in range(count):
+        word = words[n % len(words)]
+        names.append(word if n < len(words) else f"{word} {n // len(words)}")
+    return names
+
+
+def zipf_counts(total, buckets, exponent, rng):
+    """Split total over buckets with Zipf weights, in shuffled order"""
+    weights = [1 / rank**exponent for rank in range(1, buckets + 1)]
+    scale = total / sum(weights)
+    shares = [weight * scale for weight in weights]
+    counts = [int(share) for share in shares]
+    # hand the rounding remainder to the largest fractional parts
+    by_fraction = sorted(range(buckets), key=lambda n: counts[n] - shares[n])
+    for n in by_fraction[: total - sum(counts)]:
+        counts[n] += 1
+    rng.shuffle(counts)
+    return counts
+
+
+def _copy_value(value):
+    """Format a value for PostgreSQL's COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class IdAllocator:
+    """Hand out primary keys for rows inserted with explicit IDs"""
+
+    def __init__(self, model, block_size):
+        self.model = model
+        self.block_size = block_size
+        self.ids = iter(())
+        self.next_id = None
+
+    def __call__(self):
+        if connection.vendor == "postgresql":
+            for pk in self.ids:
+                return pk
+            # reserve a block from the sequence, like a regular insert would
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+                    "FROM generate_series(1, %s)",
+                    [
+                        self.model._meta.db_table,
+                        self.model._meta.pk.column,
+                        self.block_size,
+                    ],
+                )
+                self.ids = iter([row[0] for row in cursor.fetchall()])
+            return next(self.ids)
+
+        if self.next_id is None:
+            latest = self.model.objects.aggregate(latest=Max("pk"))["latest"]
+            self.next_id = (latest or 0) + 1
+        self.next_id += 1
+        return self.next_id - 1
+
+
+class TableWriter:
+    """Buffer rows for a table & write them with COPY or bulk_create"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.rows = []
+        self.written = 0
+
+    def add(self, *row):
+        self.rows.append(row)
+
+    def flush(self):
+        if not self.rows:
+            return
+        if connection.vendor == "postgresql":
+            self.copy()
+        else:
+            self.model.objects.bulk_create(
+                self.model(**dict(zip(self.fields, row))) for row in self.rows
+            )
+        self.written += len(self.rows)
+        self.rows = []
+
+    def copy(self):
+        """Stream the buffered rows through COPY ... FROM STDIN"""
+        data = io.StringIO()
+        for row in self.rows:
+            data.write("\t".join(_copy_value(value) for value in row))
+            data.write("\n")
+        data.seek(0)
+
+        quote = connection.ops.quote_name
+        columns = ", ".join(
+            quote(self.model._meta.get_field(name).column)
+            for name in self.fields
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote(self.model._meta.db_table)} ({columns}) "
+                f"FROM STDIN",
+                data,
+            )
+
+
+class Command(BaseCommand):
+    """Django command to generate a deterministic synthetic data set"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="exponent of the Zipf distribution of recipes per user",
+        )
+        parser.add_argument("--tags-per-user", type=int, default=12)
+        parser.add_argument("--ingredients-per-user", type=int, default=60)
+        parser.add_argument(
+            "--tags-per-recipe", type=int, nargs=2, default=[0, 3]
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe", type=int, nargs=2, default=[5, 20]
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--password", default="password")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        email = "seed{}-{{}}@example.com".format(options["seed"])
+        if get_user_model().objects.filter(email=email.format(0)).exists():
+            raise CommandError(
+                f"Seed {options['seed']} was already loaded, pick another."
+            )
+
+        User = get_user_model()
+        self.writers = {
+            "users": TableWriter(
+                User,
+                [
+                    "id",
+                    "email",
+                    "name",
+                    "password",
+                    "is_active",
+                    "is_staff",
+                    "is_superuser",
+                ],
+            ),
+            # numbered by primary key like migrated rows, the users'
+            # change counters start above them on first use
+            "tags": TableWriter(
+                Tag,
+                [
+                    "id",
+                    "user_id",
+                    "name",
+                    "normalized_name",
+                    "updated_at",
+                    "sync_sequence",
+                ],
+            ),
+            "ingredients": TableWriter(
+                Ingredient,
+                [
+                    "id",
+                    "user_id",
+                    "name",
+                    "normalized_name",
+                    "updated_at",
+                    "sync_sequence",
+                ],
+            ),
+            "recipes": TableWriter(
+                Recipe,
+                [
+                    "id",
+                    "user_id",
+                    "title",
+                    "price",
+                    "time_minutes",
+                    "link",
+                    "updated_at",
+                    "search_text",
+                    "sync_sequence",
+                ],
+            ),
+        }
+        for name in ("tags", "ingredients"):
+            field = Recipe._meta.get_field(name)
+            self.writers[f"recipe {name}"] = TableWriter(
+                field.remote_field.through,
+                [field.m2m_column_name(), field.m2m_reverse_name()],
+            )
+        self.new_id = {
+            model: IdAllocator(model, self.batch_size)
+            for model in (User, Tag, Ingredient, Recipe)
+        }
+
+        password = make_password(options["password"])
+        recipe_counts = zipf_counts(
+            options["recipes"], options["users"], options["zipf"], self.rng
+        )
+        with transaction.atomic():
+            for n, recipe_count in enumerate(recipe_counts):
+                user_id = self.new_id[User]()
+                self.writers["users"].add(
+                    user_id,
+                    email.format(n),
+                    f"Seed user {n}",
+                    password,
+                    True,
+                    False,
+                    False,
+                )
+                self.add_recipes(user_id, recipe_count, options)
+            self.flush()
+
+        counts = ", ".join(
+            f"{writer.written} {name}" for name, writer in self.writers.items()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {counts} in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def add_recipes(self, user_id, count, options):
+        """Buffer a user's tags, ingredients & recipes with their links"""
+        attrs = {}
+        for model, name, words, per_user in (
+            (Tag, "tags", TAG_WORDS, options["tags_per_user"]),
+            (
+                Ingredient,
+                "ingredients",
+                INGREDIENT_WORDS,
+                options["ingredients_per_user"],
+            ),
+        ):
+            attrs[name] = []
+            for attr_name in _vocabulary(words, per_user):
+                pk = self.new_id[model]()
+                self.writers[name].add(
+                    pk,
+                    user_id,
+                    attr_name,
+                    normalize_name(attr_name),
+                    self.now,
+                    pk,
+                )
+                attrs[name].append((pk, attr_name))
+
+        for _ in range(count):
+            pk = self.new_id[Recipe]()
+            chosen = {}
+            for name in ("tags", "ingredients"):
+                low, high = options[f"{name}_per_recipe"]
+                size = min(self.rng.randint(low, high), len(attrs[name]))
+                chosen[name] = self.rng.sample(attrs[name], size)
+                for attr_id, _ in chosen[name]:
+                    self.writers[f"recipe {name}"].add(pk, attr_id)
+
+            main = chosen["ingredients"][0][1] if chosen["ingredients"] else ""
+            title = " ".join(
+                word
+                for word in (
+                    self.rng.choice(TITLE_ADJECTIVES),
+                    main,
+                    self.rng.choice(TITLE_STYLES),
+                )
+                if word
+            )
+            link = ""
+            if self.rng.random() < 0.3:
+                link = f"https://example.com/recipes/{pk}"
+            self.writers["recipes"].add(
+                pk,
+                user_id,
+                title,
+                Decimal(self.rng.randint(150, 4500)).scaleb(-2),
+                self.rng.randint(5, 180),
+                link,
+                self.now,
+                # same layout as core.search.refresh_search_text
+                " ".join(
+                    [title]
+                    + [
+                        " ".join(attr for _, attr in chosen[name])
+                        for name in ("tags", "ingredients")
+                    ]
+                ),
+                pk,
+            )
+
+        if any(len(w.rows) >= self.batch_size for w in self.writers.values()):
+            self.flush()
+
+    def flush(self):
+        """Write every buffer, parents before the rows referencing them"""
+        for writer in self.writers.values():
+            writer.flush()
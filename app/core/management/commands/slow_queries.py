@@ -0,0 +1,75 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import normalize_sql
+
+
+class Command(BaseCommand):
+    """Django command summarizing the slow query log by fingerprint"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--log",
+            default=settings.SLOW_QUERY_LOG,
+            help="JSON lines file written by the slow query log",
+        )
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="print the latest query plan of each fingerprint",
+        )
+
+    def handle(self, *args, **options):
+        if not options["log"]:
+            raise CommandError("Set SLOW_QUERY_LOG or pass --log.")
+        try:
+            with open(options["log"]) as log:
+                entries = [json.loads(line) for line in log if line.strip()]
+        except FileNotFoundError:
+            raise CommandError(f"No slow query log at {options['log']}.")
+
+        summary = {}
+        for entry in entries:
+            found = summary.setdefault(
+                entry["fingerprint"],
+                {
+                    "count": 0,
+                    "seconds": 0.0,
+                    "max": 0.0,
+                    "views": set(),
+                    "sql": None,
+                    "plan": None,
+                },
+            )
+            found["count"] += entry["repeats"] + bool(entry["sql"])
+            found["seconds"] += entry["seconds"] + entry["repeat_seconds"]
+            found["max"] = max(found["max"], entry["seconds"])
+            if entry["sql"]:
+                found["sql"] = entry["sql"]
+                found["plan"] = entry["plan"] or found["plan"]
+            if entry["view"]:
+                found["views"].add(entry["view"])
+
+        ranked = sorted(
+            summary.items(), key=lambda item: item[1]["seconds"], reverse=True
+        )
+        self.stdout.write(
+            f"{'fingerprint':<12} {'count':>6} {'total ms':>10} "
+            f"{'mean ms':>9} {'max ms':>9}  views"
+        )
+        for key, found in ranked[: options["top"]]:
+            self.stdout.write(
+                f"{key:<12} {found['count']:>6} "
+                f"{found['seconds'] * 1000:>10.1f} "
+                f"{found['seconds'] * 1000 / found['count']:>9.1f} "
+                f"{found['max'] * 1000:>9.1f}  "
+                f"{', '.join(sorted(found['views'])) or '-'}"
+            )
+            if found["sql"]:
+                self.stdout.write(f"    {normalize_sql(found['sql'])}")
+            if options["plans"] and found["plan"]:
+                for line in found["plan"].splitlines():
+                    self.stdout.write(f"    | {line}")
@@ -0,0 +1,224 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+# upper bounds of the histogram buckets, +Inf is implied
+SECONDS_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# name -> (help, label names, buckets)
+HISTOGRAMS = {
+    "http_request_duration_seconds": (
+        "Time from the request reaching Django to the response leaving it",
+        ("method", "route", "status"),
+        SECONDS_BUCKETS,
+    ),
+    "http_request_db_queries": (
+        "Database queries run per request",
+        ("method", "route"),
+        QUERY_BUCKETS,
+    ),
+    "http_request_db_duration_seconds": (
+        "Time per request spent waiting on the database",
+        ("method", "route"),
+        SECONDS_BUCKETS,
+    ),
+    "http_response_render_seconds": (
+        "Time per request spent rendering the response body",
+        ("method", "route"),
+        SECONDS_BUCKETS,
+    ),
+    "http_response_size_bytes": (
+        "Size of the response body, streaming responses excluded",
+        ("method", "route"),
+        BYTES_BUCKETS,
+    ),
+}
+COUNTERS = {
+    "auth_token_cache_lookups_total": (
+        "Token authentication cache lookups by the level answering them",
+        ("result",),
+    ),
+}
+
+
+def _label_value(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return ",".join(f'{name}="{_label_value(v)}"' for name, v in pairs)
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Thread safe in-process store of request histograms
+
+    With settings.METRICS_DIR set, every process also writes its totals
+    to a file in that directory, at most every METRICS_FLUSH_INTERVAL
+    seconds, and collect() sums the files of all processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # name -> label values -> [per bucket counts..., sum, count]
+            self.histograms = {name: {} for name in HISTOGRAMS}
+
+    def observe(self, name, labels, value):
+        """Add one observation to a histogram"""
+        buckets = HISTOGRAMS[name][2]
+        with self._lock:
+            series = self.histograms[name].get(labels)
+            if series is None:
+                series = self.histograms[name][labels] = [0] * (
+                    len(buckets) + 3
+                )
+            for n, bound in enumerate(buckets):
+                if value <= bound:
+                    series[n] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """Return this process's metrics as JSON serializable data"""
+        from user.authentication import token_cache
+
+        with self._lock:
+            histograms = {
+                name: [
+                    [list(labels), list(values)]
+                    for labels, values in series.items()
+                ]
+                for name, series in self.histograms.items()
+            }
+        return {
+            "histograms": histograms,
+            "counters": {
+                "auth_token_cache_lookups_total": [
+                    [[result], count]
+                    for result, count in token_cache.counts.items()
+                ]
+            },
+        }
+
+    def _path(self):
+        return os.path.join(
+            settings.METRICS_DIR, f"metrics-{os.getpid()}.json"
+        )
+
+    def flush(self, force=False):
+        """Write this process's snapshot to the shared directory"""
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if (
+            not force
+            and now - self._last_flush < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        self._last_flush = now
+
+        path = self._path()
+        partial = f"{path}.{threading.get_ident()}.tmp"
+        with open(partial, "w") as out:
+            json.dump(self.snapshot(), out)
+        # readers only ever see complete files
+        os.replace(partial, path)
+
+    def collect(self):
+        """Return the snapshots of every process, this one included"""
+        if not settings.METRICS_DIR:
+            return [self.snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        pattern = os.path.join(settings.METRICS_DIR, "metrics-*.json")
+        for path in glob.glob(pattern):
+            try:
+                with open(path) as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Return the summed metrics in the Prometheus text format"""
+        histograms = {name: {} for name in HISTOGRAMS}
+        counters = {name: {} for name in COUNTERS}
+        for snapshot in self.collect():
+            for name, series in snapshot["histograms"].items():
+                for labels, values in series:
+                    total = histograms[name].setdefault(
+                        tuple(labels), [0] * len(values)
+                    )
+                    for n, value in enumerate(values):
+                        total[n] += value
+            for name, series in snapshot["counters"].items():
+                for labels, value in series:
+                    key = tuple(labels)
+                    counters[name][key] = counters[name].get(key, 0) + value
+
+        lines = []
+        for name, (help_text, label_names, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, values in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(
+                    buckets + (float("inf"),), values[:-2]
+                ):
+                    cumulative += count
+                    le = _labels(label_names, labels, le=_number(bound))
+                    lines.append(f"{name}_bucket{{{le}}} {cumulative}")
+                label_text = _labels(label_names, labels)
+                lines.append(
+                    f"{name}_sum{{{label_text}}} {_number(values[-2])}"
+                )
+                lines.append(f"{name}_count{{{label_text}}} {values[-1]}")
+        for name, (help_text, label_names) in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(counters[name].items()):
+                label_text = _labels(label_names, labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+atexit.register(lambda: registry.flush(force=True))
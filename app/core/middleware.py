@@ -0,0 +1,211 @@
+import cProfile
+import glob
+import io
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack, suppress
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+
+from rest_framework import exceptions
+
+from core.metrics import registry
+from core.slow_queries import slow_query_log, view_name
+from user.authentication import CachedTokenAuthentication
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class DatabaseTimer:
+    """Database execute wrapper counting queries & the time they take"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Record latency, database use & response size per route
+
+    Routes are labelled by URL name, never by path, so the number of
+    series stays bounded however many objects are requested.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timer = DatabaseTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match else UNMATCHED_ROUTE
+        labels = (request.method, route)
+        registry.observe(
+            "http_request_duration_seconds",
+            labels + (str(response.status_code),),
+            duration,
+        )
+        registry.observe("http_request_db_queries", labels, timer.queries)
+        registry.observe(
+            "http_request_db_duration_seconds", labels, timer.seconds
+        )
+        if hasattr(request, "_metrics_render_seconds"):
+            registry.observe(
+                "http_response_render_seconds",
+                labels,
+                request._metrics_render_seconds,
+            )
+        if not response.streaming:
+            registry.observe(
+                "http_response_size_bytes", labels, len(response.content)
+            )
+        registry.flush()
+        return response
+
+    def process_template_response(self, request, response):
+        """Time rendering, which starts right after the outermost hook"""
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_seconds = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class QueryLog:
+    """Database execute wrapper keeping each query's SQL & duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+
+def _is_staff(request):
+    """Return whether the session or access token belongs to staff"""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        found = CachedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return False
+    return found is not None and found[0].is_staff
+
+
+class ProfilerMiddleware:
+    """Write cProfile dumps of requests to settings.PROFILE_DIR
+
+    Staff can ask for a profile with the settings.PROFILE_HEADER header.
+    A PROFILE_SAMPLE_RATE fraction of all other requests is profiled
+    too, keeping only those slower than PROFILE_SLOW_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILE_DIR:
+            return self.get_response(request)
+        requested = settings.PROFILE_HEADER in request.META
+        if requested:
+            requested = _is_staff(request)
+        if not requested and random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        log = QueryLog()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+            duration = time.perf_counter() - start
+
+        if requested or duration >= settings.PROFILE_SLOW_SECONDS:
+            self.save(request, response, profile, log, duration)
+        return response
+
+    def save(self, request, response, profile, log, duration):
+        """Write the .prof dump & its summary, dropping the oldest"""
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match else UNMATCHED_ROUTE
+        user = getattr(request, "user", None)
+        name = "{}-{}-{}".format(
+            datetime.now().strftime("%Y%m%dT%H%M%S%f"),
+            re.sub(r"[^\w.-]+", "_", route),
+            uuid.uuid4().hex[:8],
+        )
+        path = os.path.join(settings.PROFILE_DIR, name)
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profile.dump_stats(f"{path}.prof")
+
+        summary = io.StringIO()
+        summary.write(
+            f"{request.method} {request.get_full_path()}\n"
+            f"route: {route}\n"
+            f"status: {response.status_code}\n"
+            f"user: {user.pk if user is not None else None}\n"
+            f"duration: {duration * 1000:.1f} ms\n"
+            f"queries: {len(log.queries)}, "
+            f"{sum(d for d, _ in log.queries) * 1000:.1f} ms\n\n"
+        )
+        for seconds, sql in log.queries:
+            summary.write(f"{seconds * 1000:8.2f} ms  {sql}\n")
+        summary.write("\n")
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats("cumulative").print_stats(settings.PROFILE_TOP)
+        with open(f"{path}.txt", "w") as out:
+            out.write(summary.getvalue())
+
+        dumps = sorted(glob.glob(os.path.join(settings.PROFILE_DIR, "*.prof")))
+        for old in dumps[: -settings.PROFILE_KEEP]:
+            for extension in (".prof", ".txt"):
+                with suppress(FileNotFoundError):
+                    os.remove(old[: -len(".prof")] + extension)
+
+
+class SlowQueryViewMiddleware:
+    """Tag slow queries with the view that ran them"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            slow_query_log.view = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slow_query_log.view = view_name(request.resolver_match, request.method)
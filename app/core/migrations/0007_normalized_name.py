@@ -0,0 +1,55 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+def normalize_name(name):
+    return " ".join(name.split()).lower()
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fill normalized_name and fold duplicate names into a single row"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        column = Recipe._meta.get_field(field_name).m2m_reverse_name()
+        keep = {}
+        for obj in model.objects.order_by('id').iterator():
+            key = (obj.user_id, normalize_name(obj.name))
+            if key not in keep:
+                keep[key] = obj.id
+                obj.normalized_name = key[1]
+                obj.save(update_fields=['normalized_name'])
+                continue
+            survivor = keep[key]
+            linked = set(
+                through.objects.filter(**{column: survivor})
+                .values_list('recipe_id', flat=True)
+            )
+            duplicates = through.objects.filter(**{column: obj.id})
+            duplicates.exclude(recipe_id__in=linked).update(**{column: survivor})
+            obj.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:20
+
+from django.db import migrations
+
+
+# Kept apart from 0007 so the constraint isn't added in the same transaction
+# as the data migration (PostgreSQL refuses with pending trigger events)
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('user', 'normalized_name')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='tag',
+            unique_together={('user', 'normalized_name')},
+        ),
+    ]
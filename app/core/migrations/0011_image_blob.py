@@ -0,0 +1,36 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    """Reference count images uploaded before content addressing"""
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    counts = (
+        Recipe.objects.exclude(image__isnull=True).exclude(image='')
+        .values('image').annotate(references=Count('id'))
+    )
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=row['image'], references=row['references'])
+        for row in counts.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_refresh_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
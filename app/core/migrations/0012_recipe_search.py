@@ -0,0 +1,135 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+BACKFILL = """
+UPDATE core_recipe SET search_text = title
+    || ' ' || COALESCE((
+        SELECT {agg}(t.name, ' ') FROM core_tag t
+        JOIN core_recipe_tags rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = core_recipe.id), '')
+    || ' ' || COALESCE((
+        SELECT {agg}(i.name, ' ') FROM core_ingredient i
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = core_recipe.id), '')
+"""
+
+POSTGRESQL_INSTALL = [
+    "ALTER TABLE core_recipe ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION core_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('english', NEW.search_text);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_recipe_search_vector
+    BEFORE INSERT OR UPDATE OF search_text ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector()
+    """,
+    BACKFILL.format(agg='STRING_AGG'),
+    "CREATE INDEX core_recipe_search_vector_gin "
+    "ON core_recipe USING gin (search_vector)",
+]
+
+# typo tolerance, only where the server ships the pg_trgm contrib module
+POSTGRESQL_TRIGRAM_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX core_recipe_search_text_trgm "
+    "ON core_recipe USING gin (search_text gin_trgm_ops)",
+]
+
+POSTGRESQL_REMOVE = [
+    "DROP TRIGGER core_recipe_search_vector ON core_recipe",
+    "DROP FUNCTION core_recipe_search_vector()",
+    "DROP INDEX IF EXISTS core_recipe_search_text_trgm",
+    "ALTER TABLE core_recipe DROP COLUMN search_vector",
+]
+
+SQLITE_INSTALL = [
+    BACKFILL.format(agg='GROUP_CONCAT'),
+    "CREATE VIRTUAL TABLE core_recipe_fts USING fts5("
+    "search_text, content='core_recipe', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "INSERT INTO core_recipe_fts(core_recipe_fts) VALUES ('rebuild')",
+    """
+    CREATE TRIGGER core_recipe_fts_insert AFTER INSERT ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(rowid, search_text)
+        VALUES (new.id, new.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER core_recipe_fts_delete AFTER DELETE ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(core_recipe_fts, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+    END
+    """,
+    """
+    CREATE TRIGGER core_recipe_fts_update
+    AFTER UPDATE OF search_text ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(core_recipe_fts, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+        INSERT INTO core_recipe_fts(rowid, search_text)
+        VALUES (new.id, new.search_text);
+    END
+    """,
+]
+
+SQLITE_REMOVE = [
+    "DROP TRIGGER core_recipe_fts_insert",
+    "DROP TRIGGER core_recipe_fts_delete",
+    "DROP TRIGGER core_recipe_fts_update",
+    "DROP TABLE core_recipe_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql, params=None)
+
+
+def _trigram_available(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        return cursor.fetchone() is not None
+
+
+def install_search(apps, schema_editor):
+    """Index search_text with tsvector & trigrams, or FTS5 on SQLite"""
+    postgresql = list(POSTGRESQL_INSTALL)
+    if (
+        schema_editor.connection.vendor == 'postgresql'
+        and _trigram_available(schema_editor)
+    ):
+        postgresql += POSTGRESQL_TRIGRAM_INSTALL
+    _run(schema_editor, {
+        'postgresql': postgresql,
+        'sqlite': SQLITE_INSTALL,
+    })
+
+
+def remove_search(apps, schema_editor):
+    _run(schema_editor, {
+        'postgresql': POSTGRESQL_REMOVE,
+        'sqlite': SQLITE_REMOVE,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_image_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(install_search, remove_search),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:48
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """Abort listing the emails the case insensitive index would reject
+
+    Merging accounts picks whose password, tokens & recipes survive, so
+    that is left to the operator.
+    """
+    User = apps.get_model('core', 'User')
+    duplicates = (
+        User.objects.annotate(upper=Upper('email'))
+        .values('upper')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('upper', flat=True)
+    )
+    emails = list(
+        User.objects.annotate(upper=Upper('email'))
+        .filter(upper__in=list(duplicates))
+        .order_by('upper', 'id')
+        .values_list('id', 'email')
+    )
+    if emails:
+        raise RuntimeError(
+            'Emails differing only in case must be merged or renamed '
+            'before the case insensitive email index is created: '
+            + ', '.join(f'{email} (id {pk})' for pk, email in emails)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name', 'id'], name='core_ingred_user_id_a98219_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='core_recipe_user_id_bf8313_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name', 'id'], name='core_tag_user_id_da6914_idx'),
+        ),
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        # Emails are unique regardless of case, UPPER() as iexact lookups
+        # on PostgreSQL compare UPPER(email::text) and can use the index
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX core_user_email_upper_uniq '
+             'ON core_user (UPPER(email))'],
+            reverse_sql=['DROP INDEX core_user_email_upper_uniq'],
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 2.1.15 on 2026-10-18 05:04
+
+import importlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+search = importlib.import_module('core.migrations.0012_recipe_search')
+
+
+def number_existing_rows(apps, schema_editor):
+    """Number existing rows by primary key, unique within each table
+
+    Users' counters start above these numbers, see SyncSequenceManager.
+    """
+    for model_name in ('Tag', 'Ingredient', 'Recipe'):
+        model = apps.get_model('core', model_name)
+        model.objects.update(sync_sequence=models.F('id'))
+
+
+def restore_search_triggers(apps, schema_editor):
+    """Recreate the FTS triggers SQLite drops when core_recipe is rebuilt"""
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in search.SQLITE_INSTALL:
+            if sql.lstrip().startswith('CREATE TRIGGER'):
+                schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('sync_sequence', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='sync_sequence',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='recipe',
+            name='sync_sequence',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='tag',
+            name='sync_sequence',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'sync_sequence'], name='core_ingred_user_id_dc18d6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'sync_sequence'], name='core_recipe_user_id_3cef45_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'sync_sequence'], name='core_tag_user_id_e1ce20_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'sync_sequence'], name='core_tombst_user_id_781a69_idx'),
+        ),
+    ]
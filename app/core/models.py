@@ -1,12 +1,28 @@
+import binascii
 import uuid
 import os
-from django.db import models
+from datetime import timedelta
+
+from django.db import (
+    IntegrityError,
+    connection,
+    connections,
+    models,
+    router,
+    transaction,
+)
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.conf import settings
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.cache import bump_data_version
 
 
 def recipe_image_file_path(instance, filename):
@@ -16,6 +32,68 @@ def recipe_image_file_path(instance, filename):
     return os.path.join("uploads/recipe/", filename)
 
 
+def normalize_name(name):
+    """Return the case and whitespace insensitive form of a name"""
+    return " ".join(name.split()).lower()
+
+
+class RecipeAttrConflict(APIException):
+    """Names kept being created & deleted concurrently, worth a retry"""
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "These names changed concurrently, please retry."
+    default_code = "conflict"
+
+
+class RecipeAttrManager(models.Manager):
+    def get_or_create_many(self, user, names):
+        """Return {normalized name: object}, creating the missing ones"""
+        wanted = {}
+        for name in names:
+            wanted.setdefault(normalize_name(name), " ".join(name.split()))
+        wanted.pop("", None)
+
+        for _ in range(3):
+            found = self._find_names(user, wanted)
+            missing = [
+                self.model(user=user, name=name, normalized_name=key)
+                for key, name in wanted.items()
+                if key not in found
+            ]
+            if not missing:
+                return found
+            try:
+                with transaction.atomic():
+                    sequence = SyncSequence.objects.next_value(user.pk)
+                    for obj in missing:
+                        obj.sync_sequence = sequence
+                    self.bulk_create(missing)
+            except IntegrityError:
+                # a concurrent caller created some of the same names first
+                continue
+            bump_data_version(user.pk)
+            if connection.features.can_return_ids_from_bulk_insert:
+                found.update((obj.normalized_name, obj) for obj in missing)
+                return found
+
+        # the last insert raced, or its IDs weren't returned, read only
+        found = self._find_names(user, wanted)
+        if len(found) < len(wanted):
+            raise RecipeAttrConflict()
+        return found
+
+    def _find_names(self, user, wanted):
+        return {
+            obj.normalized_name: obj
+            for obj in self.filter(user=user, normalized_name__in=wanted)
+        }
+
+
+def refresh_token_expiry():
+    """Return the expiry time for a refresh token issued now"""
+    return timezone.now() + timedelta(seconds=settings.AUTH_REFRESH_TOKEN_TTL)
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         """Creates and saves a new user"""
@@ -27,6 +105,10 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def get_by_natural_key(self, email):
+        """Look users up by email ignoring case, like its unique index"""
+        return self.get(email__iexact=email)
+
     def create_superuser(self, email, password=None):
         """Creates and saves a new staff superuser"""
         user = self.create_user(email, password)
@@ -49,32 +131,162 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
 
 
-class Tag(models.Model):
+class SyncSequenceManager(models.Manager):
+    def next_value(self, user_id):
+        """Return the next number of a user's changes sequence
+
+        The counter row stays locked until the calling transaction ends,
+        so a user's changes commit in the order of their numbers.
+        """
+        value = self._increment(user_id)
+        if value is None:
+            self._start(user_id)
+            value = self._increment(user_id)
+        return value
+
+    def current_value(self, user_id):
+        """Return the number of a user's latest committed change"""
+        value = self._current(user_id)
+        if value is None:
+            self._start(user_id)
+            value = self._current(user_id)
+        return value
+
+    def _current(self, user_id):
+        return (
+            self.filter(user_id=user_id)
+            .values_list("value", flat=True)
+            .first()
+        )
+
+    def _increment(self, user_id):
+        db = connections[self.db]
+        if db.vendor == "postgresql":
+            # bump & read the counter in one statement
+            with db.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {self.model._meta.db_table} "
+                    "SET value = value + 1 WHERE user_id = %s RETURNING value",
+                    [user_id],
+                )
+                row = cursor.fetchone()
+            return row and row[0]
+        if self.filter(user_id=user_id).update(value=models.F("value") + 1):
+            return self._current(user_id)
+        return None
+
+    def _start(self, user_id):
+        """Create a user's counter above the numbers already handed out"""
+        highest = max(
+            model.objects.filter(user_id=user_id).aggregate(
+                highest=models.Max("sync_sequence")
+            )["highest"]
+            or 0
+            for model in (Tag, Ingredient, Recipe, Tombstone)
+        )
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(user_id=user_id, value=highest)
+        except IntegrityError:
+            # a concurrent change created it first
+            pass
+
+
+class SyncSequence(models.Model):
+    """Counter numbering the changes to a user's recipe data"""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, primary_key=True, on_delete=models.CASCADE
+    )
+    value = models.BigIntegerField(default=0)
+
+    objects = SyncSequenceManager()
+
+
+class SyncedModel(models.Model):
+    """Row numbered with its owner's sequence when it last changed"""
+
+    sync_sequence = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(
+            type(self), instance=self
+        )
+        if kwargs.get("update_fields"):
+            kwargs["update_fields"] = {*kwargs["update_fields"]}
+            kwargs["update_fields"].add("sync_sequence")
+        with transaction.atomic(using=using, savepoint=False):
+            self.sync_sequence = SyncSequence.objects.db_manager(
+                using
+            ).next_value(self.user_id)
+            super().save(*args, **kwargs)
+
+
+class Tag(SyncedModel):
     """Tag to be used for a recipe"""
 
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
 
+    objects = RecipeAttrManager()
+
+    class Meta:
+        unique_together = (("user", "normalized_name"),)
+        indexes = [
+            models.Index(fields=["user", "updated_at"]),
+            # the list's cursor ordering, see RecipeAttrCursorPagination
+            models.Index(fields=["user", "-name", "id"]),
+            # the changes feed, see recipe.views.ChangesView
+            models.Index(fields=["user", "sync_sequence"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(SyncedModel):
     """Ingredient to be used in a receipe"""
 
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
 
+    objects = RecipeAttrManager()
+
+    class Meta:
+        unique_together = (("user", "normalized_name"),)
+        indexes = [
+            models.Index(fields=["user", "updated_at"]),
+            # the list's cursor ordering, see RecipeAttrCursorPagination
+            models.Index(fields=["user", "-name", "id"]),
+            # the changes feed, see recipe.views.ChangesView
+            models.Index(fields=["user", "sync_sequence"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(SyncedModel):
     """Recipe model"""
 
     user = models.ForeignKey(
@@ -97,6 +309,82 @@ class Recipe(models.Model):
 
     tags = models.ManyToManyField("Tag")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    updated_at = models.DateTimeField(auto_now=True)
+    # title, tag & ingredient names, kept current by core.search
+    search_text = models.TextField(blank=True, default="", editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "price"]),
+            models.Index(fields=["user", "time_minutes"]),
+            models.Index(fields=["user", "updated_at"]),
+            models.Index(fields=["user", "id"]),
+            models.Index(fields=["user", "sync_sequence"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored image so a replaced file can be released
+        if "image" in field_names:
+            instance._loaded_image = values[field_names.index("image")]
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.search_text:
+            # a new recipe has no tags or ingredients yet
+            self.search_text = self.title
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
+
+
+class Tombstone(models.Model):
+    """Deleted tag, ingredient or recipe, reported by the changes feed"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
+    # model name of the deleted object
+    kind = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    sync_sequence = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "sync_sequence"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+
+class ImageBlob(models.Model):
+    """Number of recipes referencing a content addressed image file"""
+
+    name = models.CharField(max_length=255, primary_key=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class RefreshToken(models.Model):
+    """Long lived token exchanged for short lived access tokens"""
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="refresh_tokens",
+        on_delete=models.CASCADE,
+    )
+    expires_at = models.DateTimeField(
+        default=refresh_token_expiry, db_index=True
+    )
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = binascii.hexlify(os.urandom(20)).decode()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.key
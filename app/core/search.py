@@ -0,0 +1,135 @@
+from django.db import connections
+from django.db.models import (
+    Aggregate,
+    BooleanField,
+    FloatField,
+    OuterRef,
+    Subquery,
+    TextField,
+    Value,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Concat
+
+from core.models import Ingredient, Recipe, Tag
+
+# text search configuration of the search_vector column, see migration 0012
+SEARCH_CONFIG = "english"
+# SQLite FTS5 table indexing Recipe.search_text, see migration 0012
+FTS_TABLE = "core_recipe_fts"
+
+# database alias -> whether pg_trgm is installed, checked once per process
+_trigram_installed = {}
+
+
+class GroupConcat(Aggregate):
+    """Space separated concatenation of the values in a group"""
+
+    function = "GROUP_CONCAT"
+    template = "%(function)s(%(expressions)s, ' ')"
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection):
+        return super().as_sql(compiler, connection, function="STRING_AGG")
+
+
+def _related_names(model):
+    """Return a subquery joining the names a recipe is related to"""
+    names = (
+        model.objects.filter(recipe=OuterRef("pk"))
+        .order_by()
+        .values("recipe")
+        .annotate(names=GroupConcat("name"))
+        .values("names")
+    )
+    return Coalesce(Subquery(names, output_field=TextField()), Value(""))
+
+
+def refresh_search_text(**filters):
+    """Rebuild the search text of matching recipes in a single UPDATE"""
+    Recipe.objects.filter(**filters).update(
+        search_text=Concat(
+            "title",
+            Value(" "),
+            _related_names(Tag),
+            Value(" "),
+            _related_names(Ingredient),
+            output_field=TextField(),
+        )
+    )
+
+
+def has_trigram(connection):
+    """Return whether the pg_trgm extension is installed in a database"""
+    if connection.alias not in _trigram_installed:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = %s", ["pg_trgm"]
+            )
+            installed = cursor.fetchone() is not None
+        _trigram_installed[connection.alias] = installed
+    return _trigram_installed[connection.alias]
+
+
+def _column(connection, name):
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    return f"{table}.{connection.ops.quote_name(name)}"
+
+
+def _fts_query(terms):
+    """Quote every term as an FTS5 prefix query, so input can't inject"""
+    return " ".join(
+        '"{}"*'.format(term.replace('"', '""')) for term in terms.split()
+    )
+
+
+def search_recipes(queryset, terms):
+    """Filter recipes matching the search terms & annotate search_rank
+
+    PostgreSQL matches the search_vector column or, for typos when
+    pg_trgm is installed, trigram word similarity against search_text.
+    SQLite queries the FTS5 table and other databases fall back to
+    substring matches without ranking.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        vector = _column(connection, "search_vector")
+        text = _column(connection, "search_text")
+        query = f"plainto_tsquery('{SEARCH_CONFIG}', %s)"
+        match = f"{vector} @@ {query}"
+        rank = f"ts_rank({vector}, {query})"
+        params = [terms]
+        if has_trigram(connection):
+            match += f" OR %s <%% {text}"
+            rank += f" + word_similarity(%s, {text})"
+            params.append(terms)
+        queryset = queryset.annotate(
+            search_match=RawSQL(
+                f"({match})", params, output_field=BooleanField()
+            )
+        ).filter(search_match=True)
+        rank = RawSQL(rank, params, output_field=FloatField())
+    elif connection.vendor == "sqlite":
+        fts = connection.ops.quote_name(FTS_TABLE)
+        match = f"{fts} MATCH %s"
+        queryset = queryset.annotate(
+            search_match=RawSQL(
+                f"{_column(connection, 'id')} IN "
+                f"(SELECT rowid FROM {fts} WHERE {match})",
+                [_fts_query(terms)],
+                output_field=BooleanField(),
+            )
+        ).filter(search_match=True)
+        # bm25 scores better matches lower
+        rank = RawSQL(
+            f"(SELECT -bm25({fts}) FROM {fts} WHERE {match} "
+            f"AND rowid = {_column(connection, 'id')})",
+            [_fts_query(terms)],
+            output_field=FloatField(),
+        )
+    else:
+        for term in terms.split():
+            queryset = queryset.filter(search_text__icontains=term)
+        rank = Value(0.0, output_field=FloatField())
+
+    return queryset.annotate(search_rank=rank)
@@ -0,0 +1,183 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import storage
+from core.cache import bump_data_version
+from core.models import Ingredient, Recipe, SyncSequence, Tag, Tombstone
+from core.search import refresh_search_text
+from core.slow_queries import slow_query_log
+
+RECIPE_RELATIONS = {
+    Recipe.tags.through: "tags",
+    Recipe.ingredients.through: "ingredients",
+}
+
+# users being deleted, their rows leave no tombstones
+_deleting_users = set()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """Time every query of new connections against the slow query log"""
+    if slow_query_log not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_log)
+
+
+def touch(model, owner=None, **filters):
+    """Mark matching rows as modified without sending save signals
+
+    Given their owner's ID, the rows also get the next number of the
+    owner's changes sequence, for rows whose representation changed.
+    """
+    changes = {"updated_at": timezone.now()}
+    if owner is not None and owner not in _deleting_users:
+        changes["sync_sequence"] = SyncSequence.objects.next_value(owner)
+    model.objects.filter(**filters).update(**changes)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created, **kwargs):
+    """Start new users on a fresh version, IDs can be reused on rollback"""
+    if created:
+        bump_data_version(instance.pk)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleting(sender, instance, **kwargs):
+    _deleting_users.add(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    _deleting_users.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def recipe_data_deleted(sender, instance, **kwargs):
+    """Leave a tombstone for the changes feed to report the deletion"""
+    if instance.user_id in _deleting_users:
+        return
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+        sync_sequence=SyncSequence.objects.next_value(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def recipe_data_changed(sender, instance, **kwargs):
+    """Invalidate the owner's cached lists when a row changes"""
+    bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, **kwargs):
+    """Count references to a new image and release the one it replaced"""
+    if "image" in instance.get_deferred_fields():
+        return
+    old = getattr(instance, "_loaded_image", None) or ""
+    new = instance.image.name or ""
+    if old == new:
+        return
+    if new:
+        storage.retain(new)
+    if old:
+        storage.release(old)
+    instance._loaded_image = new
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    """Release the image of a deleted recipe"""
+    if "image" not in instance.get_deferred_fields() and instance.image:
+        storage.release(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_retitled(sender, instance, created, **kwargs):
+    """Rebuild the search text of an updated recipe"""
+    if not created:
+        refresh_search_text(pk=instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_renamed(sender, instance, created, **kwargs):
+    """Touch & reindex recipes that nest a renamed tag or ingredient"""
+    if not created:
+        recipes = {f"{sender._meta.model_name}s": instance}
+        touch(Recipe, **recipes)
+        refresh_search_text(**recipes)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    """Touch recipes about to lose a tag or ingredient"""
+    recipes = Recipe.objects.filter(
+        **{f"{sender._meta.model_name}s": instance}
+    )
+    # the relations are gone by post_delete, remember who to reindex
+    instance._search_recipe_pks = set(recipes.values_list("pk", flat=True))
+    if instance._search_recipe_pks:
+        # the recipes' lists of IDs lose this one
+        touch(
+            Recipe, pk__in=instance._search_recipe_pks, owner=instance.user_id
+        )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_removed(sender, instance, **kwargs):
+    """Reindex the recipes that lost a deleted tag or ingredient"""
+    refresh_search_text(pk__in=getattr(instance, "_search_recipe_pks", ()))
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Touch tags & ingredients about to lose a recipe"""
+    touch(Tag, recipe=instance)
+    touch(Ingredient, recipe=instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    """Touch both sides of a recipe M2M change & invalidate cached lists"""
+    relation = RECIPE_RELATIONS[sender]
+    if action == "pre_clear":
+        # the cleared rows are gone by post_clear, collect them now
+        if reverse:
+            related = model.objects.filter(**{relation: instance})
+        else:
+            related = getattr(instance, relation).all()
+        pk_set = set(related.values_list("pk", flat=True))
+        instance._cleared_pks = pk_set
+    elif action == "post_clear":
+        pk_set = getattr(instance, "_cleared_pks", set())
+    if action in ("pre_clear", "post_add", "post_remove"):
+        # the recipe side renders the related IDs, so it changed
+        owner = instance.user_id
+        touch(type(instance), pk=instance.pk, owner=None if reverse else owner)
+        touch(model, pk__in=pk_set, owner=owner if reverse else None)
+    if action in ("post_clear", "post_add", "post_remove"):
+        refresh_search_text(pk__in=pk_set if reverse else [instance.pk])
+        bump_data_version(instance.user_id)
@@ -0,0 +1,184 @@
+import atexit
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+# the first 6 characters of statements with a query plan
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def normalize_sql(sql):
+    """Replace literals & placeholder lists so similar queries match"""
+    sql = _LITERALS.sub("?", sql)
+    sql = _LISTS.sub("(...)", sql)
+    sql = _ROWS.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    """Return a short stable ID of a query's normalized SQL"""
+    return hashlib.md5(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+def view_name(match, method):
+    """Return e.g. RecipeViewSet.list for a resolved URL & HTTP method"""
+    func = match.func
+    cls = getattr(func, "cls", None)
+    if cls is None:
+        return f"{func.__module__}.{func.__qualname__}"
+    actions = getattr(func, "actions", None) or {}
+    return f"{cls.__name__}.{actions.get(method.lower(), method.lower())}"
+
+
+def explain(connection, sql, params):
+    """Return the query plan of a query as text, or None"""
+    statement = sql.lstrip()[:6].upper()
+    if statement not in EXPLAINABLE:
+        return None
+    if connection.vendor == "postgresql":
+        # ANALYZE runs the statement again, which is only safe for reads
+        if statement == "SELECT":
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+        else:
+            prefix = "EXPLAIN "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+
+    try:
+        # a savepoint, so a failing EXPLAIN can't break the transaction
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        logger.exception("Unable to explain a slow query")
+        return None
+    # SQLite rows are (id, parent, notused, detail)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+class SlowQueryLog:
+    """Database execute wrapper logging queries over a time threshold
+
+    Each fingerprint is logged, with its query plan, at most once per
+    settings.SLOW_QUERY_INTERVAL seconds. Repeats in between are
+    counted and reported with the next record of that fingerprint.
+    Records go to the core.slow_queries logger and, as JSON lines, to
+    settings.SLOW_QUERY_LOG when set.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self._lock = threading.Lock()
+        # fingerprint -> [last logged, repeats since, their seconds]
+        self.seen = {}
+
+    @property
+    def view(self):
+        """The view running queries on this thread, set per request"""
+        return getattr(self.local, "view", None)
+
+    @view.setter
+    def view(self, value):
+        self.local.view = value
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.SLOW_QUERY_SECONDS
+        if threshold is None or getattr(self.local, "explaining", False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= threshold:
+            self.record(context["connection"], sql, params, many, duration)
+        return result
+
+    def record(self, connection, sql, params, many, duration):
+        key = fingerprint(sql)
+        now = time.monotonic()
+        with self._lock:
+            seen = self.seen.get(key)
+            if seen and now - seen[0] < settings.SLOW_QUERY_INTERVAL:
+                seen[1] += 1
+                seen[2] += duration
+                return
+            repeats, repeat_seconds = (seen[1], seen[2]) if seen else (0, 0)
+            self.seen[key] = [now, 0, 0.0]
+
+        plan = None
+        if not many:
+            self.local.explaining = True
+            try:
+                plan = explain(connection, sql, params)
+            finally:
+                self.local.explaining = False
+        logger.warning(
+            "Slow query %s took %.1f ms in %s: %s",
+            key,
+            duration * 1000,
+            self.view,
+            sql,
+        )
+        self.write(
+            {
+                "time": time.time(),
+                "fingerprint": key,
+                "seconds": round(duration, 6),
+                "repeats": repeats,
+                "repeat_seconds": round(repeat_seconds, 6),
+                "view": self.view,
+                "vendor": connection.vendor,
+                "sql": sql,
+                "plan": plan,
+            }
+        )
+
+    def write(self, entry):
+        """Append a record to settings.SLOW_QUERY_LOG, when set"""
+        if settings.SLOW_QUERY_LOG:
+            with self._lock, open(settings.SLOW_QUERY_LOG, "a") as out:
+                out.write(json.dumps(entry) + "\n")
+
+    def flush(self):
+        """Report the repeats not logged yet, e.g. as a process exits"""
+        with self._lock:
+            pending = [
+                (key, seen[1], seen[2])
+                for key, seen in self.seen.items()
+                if seen[1]
+            ]
+            self.seen.clear()
+        for key, repeats, seconds in pending:
+            # no sql marks a record of repeats only
+            self.write(
+                {
+                    "time": time.time(),
+                    "fingerprint": key,
+                    "seconds": 0,
+                    "repeats": repeats,
+                    "repeat_seconds": round(seconds, 6),
+                    "view": None,
+                    "vendor": None,
+                    "sql": None,
+                    "plan": None,
+                }
+            )
+
+
+slow_query_log = SlowQueryLog()
+atexit.register(slow_query_log.flush)
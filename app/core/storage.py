@@ -0,0 +1,124 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from core.models import ImageBlob, Recipe
+
+
+def derived_directory(name):
+    """Return the directory holding files generated from a stored file"""
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, "variants", os.path.splitext(filename)[0])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names every file by its SHA-256
+
+    Files are fanned out over two directory levels taken from the hash,
+    so identical uploads share one file. upload_to still supplies the
+    base directory & extension. ImageBlob counts references to each file.
+    """
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        # hash while streaming to a temporary file on the same filesystem
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            dir=self.path(directory), suffix=".part", delete=False
+        ) as tmp:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        hexdigest = digest.hexdigest()
+        name = os.path.join(
+            directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension
+        )
+        full_path = self.path(name)
+        # in the transaction of the model save that counts the reference,
+        # so the file can't be freed between this check & that count
+        with transaction.atomic():
+            lock(name)
+            if os.path.exists(full_path):
+                os.remove(tmp.name)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp.name, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+
+        return name.replace("\\", "/")
+
+    def delete(self, name):
+        """Delete a file unless a recipe still references it"""
+        with transaction.atomic():
+            lock(name)
+            blobs = ImageBlob.objects.filter(name=name)
+            if not blobs.filter(references__gt=0).exists():
+                self.delete_blob(name)
+                blobs.delete()
+
+    def delete_blob(self, name):
+        """Delete a file and everything generated from it"""
+        super().delete(name)
+        shutil.rmtree(self.path(derived_directory(name)), ignore_errors=True)
+
+
+def lock(name):
+    """Lock the reference count of a stored file until the transaction ends
+
+    Creates the count at zero for a new file. A no-op update takes the
+    row lock on PostgreSQL & the database write lock on SQLite.
+    """
+    blobs = ImageBlob.objects.filter(name=name)
+    if blobs.update(references=F("references")):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, references=0)
+    except IntegrityError:
+        # a concurrent upload of the same content created the row
+        blobs.update(references=F("references"))
+
+
+def retain(name):
+    """Count one more reference to a stored file"""
+    blobs = ImageBlob.objects.filter(name=name)
+    if blobs.update(references=F("references") + 1):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, references=1)
+    except IntegrityError:
+        # a concurrent upload of the same content created the row
+        blobs.update(references=F("references") + 1)
+
+
+def release(name):
+    """Drop a reference, freeing the file once nothing uses it"""
+    ImageBlob.objects.filter(name=name, references__gt=0).update(
+        references=F("references") - 1
+    )
+    transaction.on_commit(lambda: free_if_unreferenced(name))
+
+
+def free_if_unreferenced(name):
+    """Delete the file & its row if the reference count is still zero"""
+    with transaction.atomic():
+        # waits for uploads holding lock() & re-checks the count after
+        blob = (
+            ImageBlob.objects.select_for_update()
+            .filter(name=name, references=0)
+            .first()
+        )
+        if blob is not None:
+            Recipe._meta.get_field("image").storage.delete_blob(name)
+            blob.delete()
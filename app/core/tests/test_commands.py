@@ -1,8 +1,24 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import Count
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe, RefreshToken
+from recipe import images
 
 
 class CommandTests(TestCase):
@@ -20,3 +36,209 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command("wait_for_db")
             self.assertEqual(gi.call_count, 6)
+
+    def test_clear_expired_tokens(self):
+        """Test expired access and refresh tokens are deleted in batches"""
+        users = [
+            get_user_model().objects.create_user(f"u{n}@foobar.com", "pass")
+            for n in range(3)
+        ]
+        expired = timezone.now() - timedelta(days=60)
+        for user in users[:2]:
+            token = Token.objects.create(user=user)
+            Token.objects.filter(pk=token.pk).update(created=expired)
+            RefreshToken.objects.create(user=user, expires_at=expired)
+        Token.objects.create(user=users[2])
+        RefreshToken.objects.create(user=users[2])
+
+        call_command("clear_expired_tokens", batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(Token.objects.values_list("user", flat=True)), [users[2].id]
+        )
+        self.assertEqual(RefreshToken.objects.count(), 1)
+
+    def test_benchmark_list_serializers(self):
+        """Test the serializer benchmark reports each size & rolls back"""
+        out = StringIO()
+
+        call_command(
+            "benchmark_list_serializers",
+            rows=[3, 5],
+            repeat=1,
+            page_size=2,
+            stdout=out,
+        )
+
+        sizes = [line.split()[0] for line in out.getvalue().splitlines()]
+        self.assertEqual(sizes, ["rows", "3", "5"])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def seed(self, **options):
+        """Run seed_data with small counts, returning what it created"""
+        defaults = {
+            "users": 5,
+            "recipes": 40,
+            "tags_per_user": 4,
+            "ingredients_per_user": 25,
+            "batch_size": 7,
+            "stdout": StringIO(),
+        }
+        defaults.update(options)
+        call_command("seed_data", **defaults)
+        return [
+            (
+                recipe.user.email,
+                recipe.title,
+                sorted(recipe.ingredients.values_list("name", flat=True)),
+                sorted(recipe.tags.values_list("name", flat=True)),
+            )
+            for recipe in Recipe.objects.order_by("id")
+        ]
+
+    def test_seed_data(self):
+        """Test seed_data creates skewed users, recipes & relations"""
+        recipes = self.seed(seed=3)
+
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertEqual(len(recipes), 40)
+        per_user = sorted(
+            Recipe.objects.values("user")
+            .annotate(count=Count("id"))
+            .values_list("count", flat=True)
+        )
+        # Zipf: the busiest user has several times the recipes of the least
+        self.assertGreater(per_user[-1], 3 * per_user[0])
+        for _, _, ingredients, tags in recipes:
+            self.assertTrue(5 <= len(ingredients) <= 20)
+            self.assertTrue(len(tags) <= 3)
+        recipe = Recipe.objects.first()
+        self.assertTrue(recipe.search_text.startswith(recipe.title))
+
+    def test_seed_data_deterministic(self):
+        """Test the same seed generates the same data"""
+        with transaction.atomic():
+            first = self.seed(seed=5)
+            transaction.set_rollback(True)
+
+        self.assertEqual(self.seed(seed=5), first)
+
+    def test_seed_data_twice_rejected(self):
+        """Test loading the same seed twice is refused"""
+        self.seed(seed=1, users=1, recipes=1)
+
+        with self.assertRaises(CommandError):
+            self.seed(seed=1, users=1, recipes=1)
+
+    def benchmark_api(self, tmp, **options):
+        """Run benchmark_api on a tiny seed, returning its JSON results"""
+        output = os.path.join(tmp, "results.json")
+        defaults = {
+            "users": 3,
+            "recipes": 12,
+            "sample_users": 2,
+            "requests": 3,
+            "warmup": 1,
+            "concurrency": 1,
+            "output": output,
+            "stdout": StringIO(),
+            "stderr": StringIO(),
+        }
+        defaults.update(options)
+        with override_settings(MEDIA_ROOT=tmp):
+            call_command("benchmark_api", **defaults)
+        with open(output) as results:
+            return json.load(results), defaults["stderr"].getvalue()
+
+    def test_benchmark_api(self):
+        """Test the API benchmark covers every route without errors"""
+        with tempfile.TemporaryDirectory() as tmp:
+            results, warnings = self.benchmark_api(tmp)
+
+        self.assertEqual(warnings, "")
+        self.assertIn("recipe-search", results["scenarios"])
+        for name, stats in results["scenarios"].items():
+            self.assertEqual(stats["errors"], 0, name)
+            self.assertEqual(stats["requests"], 3)
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertGreater(results["peak_rss_kb"], 0)
+        # only the seeded users remain, the benchmark's own are deleted
+        self.assertFalse(
+            get_user_model()
+            .objects.exclude(email__startswith="seed0-")
+            .exists()
+        )
+
+    def test_benchmark_api_baseline_regression(self):
+        """Test results slower than the baseline fail the command"""
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            with open(baseline, "w") as out:
+                json.dump(
+                    {
+                        "scenarios": {
+                            "api-root": {
+                                "p50_ms": 0.0001,
+                                "p95_ms": 1000,
+                                "p99_ms": 1000,
+                                "rps": 0,
+                                "queries_mean": 0,
+                            }
+                        }
+                    },
+                    out,
+                )
+
+            with self.assertRaisesMessage(CommandError, "1 metrics"):
+                self.benchmark_api(tmp, only=["api-root"], baseline=baseline)
+
+    def test_index_advisor(self):
+        """Test the advisor replays the API reads & reports their plans"""
+        self.seed(seed=2)
+        out = StringIO()
+
+        call_command("index_advisor", stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "Sequential scans of app tables:")
+        self.assertIn("Indexes unused by the replayed queries:", lines)
+        self.assertFalse(Token.objects.exists())
+
+    def test_index_advisor_unknown_user(self):
+        """Test the advisor needs a user to replay requests as"""
+        with self.assertRaises(CommandError):
+            call_command("index_advisor", email="nobody@example.com")
+
+    def test_generate_image_variants(self):
+        """Test missing variants are generated, complete sets skipped"""
+        user = get_user_model().objects.create_user("i@foobar.com", "pass")
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media, RECIPE_IMAGE_WORKERS=1):
+                self.addCleanup(setattr, images, "_executor", None)
+                name = "uploads/recipe/old.jpg"
+                os.makedirs(os.path.join(media, "uploads/recipe"))
+                Image.new("RGB", (40, 20)).save(os.path.join(media, name))
+                for title in ("Old", "Copy"):
+                    Recipe.objects.create(
+                        user=user,
+                        title=title,
+                        price=1,
+                        time_minutes=1,
+                        image=name,
+                    )
+
+                out = StringIO()
+                call_command("generate_image_variants", stdout=out)
+                again = StringIO()
+                call_command("generate_image_variants", stdout=again)
+                images.get_executor().shutdown()
+
+                for variant in images.VARIANTS:
+                    path = os.path.join(
+                        media, images.variant_name(name, variant)
+                    )
+                    self.assertTrue(os.path.exists(path))
+
+        self.assertIn("variants of 1 images, 0 failed", out.getvalue())
+        self.assertIn("variants of 0 images, 0 failed", again.getvalue())
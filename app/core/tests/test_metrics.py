@@ -0,0 +1,170 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.metrics import registry
+
+METRICS_URL = reverse("metrics")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "metrics@foobar.com", "testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.staff_client = Client()
+        self.staff_client.force_login(
+            get_user_model().objects.create_superuser(
+                "staff@foobar.com", "testpass"
+            )
+        )
+
+    def metrics(self):
+        """Return the /metrics lines, without the HELP & TYPE comments"""
+        response = self.staff_client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return [
+            line
+            for line in response.content.decode().splitlines()
+            if not line.startswith("#")
+        ]
+
+    def test_request_recorded_per_route(self):
+        """Test latency, queries & size are recorded by URL name"""
+        self.client.get(reverse("recipe:tag-list"))
+        self.client.get(reverse("recipe:tag-list"))
+        self.client.get(reverse("recipe:recipe-detail", args=[999]))
+
+        lines = self.metrics()
+
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="recipe:tag-list",status="200"} 2',
+            lines,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="recipe:recipe-detail",status="404"} 1',
+            lines,
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{method="GET",'
+            'route="recipe:tag-list",le="+Inf"} 2',
+            lines,
+        )
+        for name in (
+            "http_request_db_duration_seconds_count",
+            "http_response_render_seconds_count",
+            "http_response_size_bytes_count",
+        ):
+            self.assertIn(
+                f'{name}{{method="GET",route="recipe:tag-list"}} 2', lines
+            )
+
+    def test_histogram_buckets_cumulative(self):
+        """Test buckets count every observation at or below their bound"""
+        labels = ("GET", "recipe:tag-list")
+        for queries in (0, 2, 2, 500):
+            registry.observe("http_request_db_queries", labels, queries)
+
+        lines = self.metrics()
+
+        prefix = 'http_request_db_queries_bucket{method="GET",'
+        prefix += 'route="recipe:tag-list",le='
+        self.assertIn(prefix + '"0"} 1', lines)
+        self.assertIn(prefix + '"1"} 1', lines)
+        self.assertIn(prefix + '"2"} 3', lines)
+        self.assertIn(prefix + '"100"} 3', lines)
+        self.assertIn(prefix + '"+Inf"} 4', lines)
+        self.assertIn(
+            'http_request_db_queries_sum{method="GET",'
+            'route="recipe:tag-list"} 504',
+            lines,
+        )
+
+    def test_unmatched_route(self):
+        """Test unknown paths share one series instead of one per path"""
+        self.client.get("/no/such/page/1")
+        self.client.get("/no/such/page/2")
+
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="<unmatched>",status="404"} 2',
+            self.metrics(),
+        )
+
+    def test_token_cache_counters(self):
+        """Test token cache lookups are exported as counters"""
+        lines = self.metrics()
+
+        self.assertTrue(
+            any(
+                line.startswith(
+                    'auth_token_cache_lookups_total{result="misses"}'
+                )
+                for line in lines
+            )
+        )
+
+    def test_multiprocess_directory(self):
+        """Test metrics written by other processes are summed in"""
+        labels = ["GET", "recipe:tag-list"]
+        registry.observe("http_request_db_queries", tuple(labels), 1)
+        other = {
+            "histograms": {
+                "http_request_db_queries": [
+                    [labels, [0, 3, 0, 0, 0, 0, 0, 0, 0, 0, 3, 3]]
+                ]
+            },
+            "counters": {"auth_token_cache_lookups_total": []},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "metrics-1.json"), "w") as out:
+                json.dump(other, out)
+
+            with override_settings(METRICS_DIR=tmp):
+                lines = self.metrics()
+                self.assertTrue(
+                    os.path.exists(
+                        os.path.join(tmp, f"metrics-{os.getpid()}.json")
+                    )
+                )
+
+        self.assertIn(
+            'http_request_db_queries_bucket{method="GET",'
+            'route="recipe:tag-list",le="1"} 4',
+            lines,
+        )
+        self.assertIn(
+            'http_request_db_queries_count{method="GET",'
+            'route="recipe:tag-list"} 4',
+            lines,
+        )
+
+    def test_metrics_staff_only_without_token(self):
+        """Test only staff may read the metrics when no token is set"""
+        self.assertEqual(Client().get(METRICS_URL).status_code, 403)
+
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(client.get(METRICS_URL).status_code, 403)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token_required(self):
+        """Test scraping requires the bearer token once one is set"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+        response = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
@@ -1,3 +1,4 @@
+from django.db import IntegrityError, connection
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from core import models
@@ -26,6 +27,13 @@ class ModelTests(TestCase):
         user = get_user_model().objects.create_user(email, "test123")
         self.assertEqual(user.email, email.lower())
 
+    def test_email_unique_ignoring_case(self):
+        """Test the database rejects emails differing only in case"""
+        get_user_model().objects.create_user("foo@bar.com", "test123")
+
+        with self.assertRaises(IntegrityError):
+            get_user_model().objects.create_user("FOO@bar.com", "test123")
+
     def test_new_user_invalid_email(self):
         """Test creating user with no email raises error"""
         with self.assertRaises(ValueError):
@@ -63,6 +71,118 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(recipe), recipe.title)
 
+    def test_get_or_create_many_normalizes_names(self):
+        """Test names differing in case & whitespace map to one tag"""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name="Main  Course")
+
+        found = models.Tag.objects.get_or_create_many(
+            user, ["main course", " Starter", "STARTER"]
+        )
+
+        self.assertEqual(found["main course"], tag)
+        self.assertEqual(found["starter"].name, "Starter")
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
+
+    def test_get_or_create_many_rereads_after_races(self):
+        """Test names a racing caller created are read after the retries"""
+        user = sample_user()
+
+        tag = models.Tag.objects.create(user=user, name="Vegan")
+        find_names = models.Tag.objects._find_names
+        reads = []
+
+        def find(*args):
+            # each attempt reads before the racing caller's insert commits
+            reads.append(args)
+            return {} if len(reads) <= 3 else find_names(*args)
+
+        with patch.object(models.Tag.objects, "_find_names", find):
+            with patch.object(
+                models.Tag.objects,
+                "bulk_create",
+                side_effect=IntegrityError("duplicate key"),
+            ) as bulk_create:
+                found = models.Tag.objects.get_or_create_many(
+                    user, ["Vegan"]
+                )
+
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertEqual(found["vegan"], tag)
+
+    def test_get_or_create_many_conflict(self):
+        """Test names that never settle raise a conflict, not a KeyError"""
+        user = sample_user()
+
+        with patch.object(
+            models.Tag.objects,
+            "bulk_create",
+            side_effect=IntegrityError("duplicate key"),
+        ):
+            with self.assertRaises(models.RecipeAttrConflict):
+                models.Tag.objects.get_or_create_many(user, ["Vegan"])
+
+    def test_changes_numbered_in_sequence(self):
+        """Test saves take increasing numbers from the owner's sequence"""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name="Vegan")
+        recipe = models.Recipe.objects.create(
+            user=user, title="Dal", time_minutes=5, price=5
+        )
+        first = recipe.sync_sequence
+
+        recipe.title = "Tarka dal"
+        recipe.save(update_fields=["title"])
+        recipe.refresh_from_db()
+
+        self.assertGreater(first, tag.sync_sequence)
+        self.assertGreater(recipe.sync_sequence, first)
+        self.assertEqual(
+            models.SyncSequence.objects.current_value(user.pk),
+            recipe.sync_sequence,
+        )
+
+    def test_sequence_starts_above_existing_numbers(self):
+        """Test a new counter continues after numbers already handed out"""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name="Vegan")
+        # numbered by a migration before the counter existed
+        models.Tag.objects.update(sync_sequence=100)
+        models.SyncSequence.objects.all().delete()
+
+        self.assertEqual(models.SyncSequence.objects.next_value(user.pk), 101)
+
+    def test_deletes_leave_tombstones(self):
+        """Test deleting a recipe records it for the changes feed"""
+        user = sample_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title="Dal", time_minutes=5, price=5
+        )
+        recipe_id = recipe.id
+
+        recipe.delete()
+
+        tombstone = models.Tombstone.objects.get(user=user)
+        self.assertEqual(tombstone.kind, "recipe")
+        self.assertEqual(tombstone.object_id, recipe_id)
+        self.assertGreater(tombstone.sync_sequence, recipe.sync_sequence)
+
+    def test_deleting_user_leaves_no_tombstones(self):
+        """Test a user's rows deleted along with it leave no tombstones"""
+        user = sample_user()
+        tag = models.Tag.objects.create(user=user, name="Vegan")
+        recipe = models.Recipe.objects.create(
+            user=user, title="Dal", time_minutes=5, price=5
+        )
+        recipe.tags.add(tag)
+
+        user.delete()
+        # foreign keys are checked at commit, which TestCase never reaches
+        connection.check_constraints()
+
+        self.assertFalse(models.Tombstone.objects.exists())
+        self.assertFalse(models.SyncSequence.objects.exists())
+
     @patch("uuid.uuid4")
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test that image is saved in the correct location"""
@@ -0,0 +1,87 @@
+import glob
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from user.authentication import issue_access_token
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.profile_settings = override_settings(
+            PROFILE_DIR=self.tmp.name, PROFILE_SAMPLE_RATE=0
+        )
+        self.profile_settings.enable()
+        self.staff = get_user_model().objects.create_user(
+            "staff@foobar.com", "testpass", is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            "user@foobar.com", "testpass"
+        )
+
+    def tearDown(self):
+        self.profile_settings.disable()
+        self.tmp.cleanup()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Token {issue_access_token(user).key}"
+        )
+        return client
+
+    def dumps(self):
+        return sorted(glob.glob(os.path.join(self.tmp.name, "*.prof")))
+
+    def test_staff_header_profiles_request(self):
+        """Test staff get a dump & summary by sending the header"""
+        res = self.client_for(self.staff).get(TAGS_URL, HTTP_X_PROFILE="1")
+
+        self.assertEqual(res.status_code, 200)
+        dumps = self.dumps()
+        self.assertEqual(len(dumps), 1)
+        self.assertIn("recipe_tag-list", dumps[0])
+        with open(dumps[0][: -len(".prof")] + ".txt") as summary:
+            text = summary.read()
+        self.assertIn("route: recipe:tag-list", text)
+        self.assertIn(f"user: {self.staff.pk}", text)
+        self.assertIn("SELECT", text)
+        self.assertIn("cumulative", text)
+
+    def test_header_ignored_for_other_users(self):
+        """Test users who are not staff can't trigger the profiler"""
+        self.client_for(self.user).get(TAGS_URL, HTTP_X_PROFILE="1")
+        APIClient().get(TAGS_URL, HTTP_X_PROFILE="1")
+
+        self.assertEqual(self.dumps(), [])
+
+    def test_sampled_requests_kept_when_slow(self):
+        """Test sampled requests are only kept above the threshold"""
+        client = self.client_for(self.user)
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_SECONDS=60):
+            client.get(TAGS_URL)
+        self.assertEqual(self.dumps(), [])
+
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_SLOW_SECONDS=0):
+            client.get(TAGS_URL)
+        self.assertEqual(len(self.dumps()), 1)
+
+    def test_oldest_dumps_rotated_out(self):
+        """Test only the newest PROFILE_KEEP dumps are kept"""
+        client = self.client_for(self.staff)
+        with self.settings(PROFILE_KEEP=2):
+            for _ in range(3):
+                client.get(TAGS_URL, HTTP_X_PROFILE="1")
+
+        self.assertEqual(len(self.dumps()), 2)
+        self.assertEqual(
+            len(glob.glob(os.path.join(self.tmp.name, "*.txt"))), 2
+        )
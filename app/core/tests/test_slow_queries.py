@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from core.slow_queries import fingerprint, normalize_sql, slow_query_log
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.tmp.name, "slow.jsonl")
+        self.user = get_user_model().objects.create_user(
+            "slow@foobar.com", "testpass"
+        )
+        slow_query_log.seen.clear()
+
+    def tearDown(self):
+        slow_query_log.seen.clear()
+        self.tmp.cleanup()
+
+    def entries(self):
+        with open(self.log) as log:
+            return [json.loads(line) for line in log]
+
+    def test_fingerprint_ignores_values(self):
+        """Test queries differing in literals & list sizes match"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND x = 'a'"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s)  AND x = 'b''c'"),
+        )
+        self.assertEqual(
+            normalize_sql("INSERT INTO t1 VALUES (%s, %s), (%s, %s) LIMIT 21"),
+            "INSERT INTO t1 VALUES (...) LIMIT ?",
+        )
+        self.assertNotEqual(
+            fingerprint("SELECT a FROM t"), fingerprint("SELECT b FROM t")
+        )
+
+    def test_slow_queries_logged_with_view_and_plan(self):
+        """Test slow queries record the view running them & their plan"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.settings(SLOW_QUERY_SECONDS=0, SLOW_QUERY_LOG=self.log):
+            with self.assertLogs("core.slow_queries", "WARNING"):
+                res = client.get(reverse("recipe:tag-list"))
+
+        self.assertEqual(res.status_code, 200)
+        entries = [
+            entry
+            for entry in self.entries()
+            if "core_tag" in entry["sql"] and entry["sql"].startswith("SELECT")
+        ]
+        self.assertTrue(entries)
+        self.assertEqual(entries[0]["view"], "TagViewSet.list")
+        self.assertTrue(entries[0]["plan"])
+        self.assertIsNone(slow_query_log.view)
+
+    def test_installed_on_connections(self):
+        """Test every connection times its queries once"""
+        connection.ensure_connection()
+
+        self.assertEqual(connection.execute_wrappers.count(slow_query_log), 1)
+
+    def test_fast_queries_not_logged(self):
+        """Test queries under the threshold are not recorded"""
+        with self.settings(SLOW_QUERY_SECONDS=60, SLOW_QUERY_LOG=self.log):
+            list(Tag.objects.all())
+
+        self.assertFalse(os.path.exists(self.log))
+
+    @override_settings(SLOW_QUERY_SECONDS=0, SLOW_QUERY_INTERVAL=60)
+    def test_repeats_rate_limited(self):
+        """Test a fingerprint is logged once per interval, then counted"""
+        with self.settings(SLOW_QUERY_LOG=self.log):
+            with self.assertLogs("core.slow_queries", "WARNING") as logs:
+                for name in ("a", "b", "c"):
+                    list(Tag.objects.filter(name=name))
+                slow_query_log.flush()
+
+        # the repeats are counted in the log file, not logged again
+        tag_logs = [line for line in logs.output if "core_tag" in line]
+        self.assertEqual(len(tag_logs), 1)
+        entries = self.entries()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]["fingerprint"], entries[1]["fingerprint"])
+        self.assertEqual(entries[0]["repeats"], 0)
+        self.assertIsNone(entries[1]["sql"])
+        self.assertEqual(entries[1]["repeats"], 2)
+
+    def test_summary_command(self):
+        """Test the summary ranks fingerprints by total time"""
+        with open(self.log, "w") as log:
+            for key, seconds, repeats, sql in (
+                ("fast", 0.5, 0, "SELECT 1"),
+                ("slow", 0.75, 2, "SELECT 2"),
+                ("slow", 0, 1, None),
+            ):
+                entry = {
+                    "fingerprint": key,
+                    "seconds": seconds,
+                    "repeats": repeats,
+                    "repeat_seconds": 0.25 * repeats,
+                    "view": "RecipeViewSet.list",
+                    "sql": sql,
+                    "plan": "SCAN core_recipe",
+                }
+                log.write(json.dumps(entry) + "\n")
+        out = StringIO()
+
+        call_command("slow_queries", log=self.log, plans=True, stdout=out)
+
+        rows = [
+            line.split()
+            for line in out.getvalue().splitlines()
+            if not line.startswith(" ")
+        ]
+        self.assertEqual(rows[1][:3], ["slow", "4", "1500.0"])
+        self.assertEqual(rows[2][:3], ["fast", "1", "500.0"])
+        self.assertIn("| SCAN core_recipe", out.getvalue())
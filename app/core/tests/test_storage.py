@@ -0,0 +1,133 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TestCase
+
+from core import storage
+from core.models import ImageBlob, Recipe
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test the content addressed, reference counted image storage"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = storage.ContentAddressedStorage(location=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_names_file_by_hash(self):
+        """Test files are sharded by the first bytes of their hash"""
+        name = self.storage.save("uploads/recipe/a.JPG", ContentFile(b"x"))
+
+        digest = (
+            "2d711642b726b04401627ca9fbac32f5c8530fb1903cc4db02258717921a4881"
+        )
+        self.assertEqual(name, f"uploads/recipe/2d/71/{digest}.jpg")
+        self.assertTrue(os.path.exists(self.storage.path(name)))
+
+    def test_identical_content_stored_once(self):
+        """Test uploading the same bytes twice reuses the first file"""
+        first = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        second = self.storage.save("uploads/recipe/b.jpg", ContentFile(b"x"))
+
+        self.assertEqual(first, second)
+        shard = os.path.dirname(self.storage.path(first))
+        self.assertEqual(len(os.listdir(shard)), 1)
+
+    def test_referenced_file_not_deleted(self):
+        """Test delete() keeps files a recipe still references"""
+        name = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        storage.retain(name)
+
+        self.storage.delete(name)
+
+        self.assertTrue(self.storage.exists(name))
+
+    def test_release_frees_unreferenced_file(self):
+        """Test the file goes once the last reference is released"""
+        name = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        storage.retain(name)
+        storage.retain(name)
+
+        field = Recipe._meta.get_field("image")
+        with patch.object(field, "storage", self.storage):
+            storage.release(name)
+            storage.free_if_unreferenced(name)
+            self.assertTrue(self.storage.exists(name))
+
+            storage.release(name)
+            storage.free_if_unreferenced(name)
+
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_save_locks_count_before_checking_file(self):
+        """Test a file is only looked for once its count row exists"""
+        name = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        ImageBlob.objects.filter(pk=name).delete()
+        path_exists = os.path.exists
+        counted = []
+
+        def exists(path):
+            if path == self.storage.path(name):
+                counted.append(ImageBlob.objects.filter(pk=name).exists())
+            return path_exists(path)
+
+        with patch.object(storage.os.path, "exists", exists):
+            self.storage.save("uploads/recipe/b.jpg", ContentFile(b"x"))
+
+        self.assertEqual(counted, [True])
+
+    def test_free_keeps_file_referenced_after_save(self):
+        """Test a free after an upload counted its reference keeps the file"""
+        name = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        storage.retain(name)
+        storage.release(name)
+
+        field = Recipe._meta.get_field("image")
+        with patch.object(field, "storage", self.storage):
+            with transaction.atomic():
+                self.storage.save("uploads/recipe/b.jpg", ContentFile(b"x"))
+                storage.retain(name)
+            storage.free_if_unreferenced(name)
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(pk=name).references, 1)
+
+    def test_delete_unreferenced_file(self):
+        """Test delete() removes a file nothing references, row & all"""
+        name = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+
+        self.storage.delete(name)
+
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(pk=name).exists())
+
+    def test_recipe_image_reference_counting(self):
+        """Test replacing & deleting recipe images updates the counts"""
+        user = get_user_model().objects.create_user("s@foobar.com", "pass")
+        recipe = Recipe.objects.create(
+            user=user, title="Toast", price=1.00, time_minutes=2
+        )
+
+        recipe.image = "uploads/recipe/old.jpg"
+        recipe.save()
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        recipe.image = "uploads/recipe/new.jpg"
+        recipe.save()
+
+        blobs = dict(ImageBlob.objects.values_list("name", "references"))
+        self.assertEqual(
+            blobs, {"uploads/recipe/old.jpg": 0, "uploads/recipe/new.jpg": 1}
+        )
+
+        recipe.delete()
+        self.assertEqual(
+            ImageBlob.objects.get(name="uploads/recipe/new.jpg").references, 0
+        )
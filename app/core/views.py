@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from core.metrics import registry
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics(request):
+    """Serve the request metrics in the Prometheus text format
+
+    Scrapers send the METRICS_TOKEN bearer token. Without a token set,
+    only staff signed in to the admin may read them.
+    """
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.META.get("HTTP_AUTHORIZATION", ""),
+            f"Bearer {settings.METRICS_TOKEN}",
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
@@ -0,0 +1,103 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from core.storage import derived_directory
+
+logger = logging.getLogger(__name__)
+
+# name: (bounding box, Pillow format, file extension), largest first
+VARIANTS = {
+    "medium": ((600, 600), "JPEG", "jpg"),
+    "webp": ((600, 600), "WEBP", "webp"),
+    "thumbnail": ((150, 150), "JPEG", "jpg"),
+}
+
+_executor = None
+
+
+def variant_name(name, variant):
+    """Return the storage name of one variant of an uploaded image"""
+    extension = VARIANTS[variant][2]
+    return os.path.join(derived_directory(name), f"{variant}.{extension}")
+
+
+def variant_urls(name):
+    """Return {variant: url} for an uploaded image"""
+    return {
+        variant: default_storage.url(variant_name(name, variant))
+        for variant in VARIANTS
+    }
+
+
+def generate_variants(source, targets):
+    """Write every variant of the image at source, runs in a worker"""
+    largest = max(size for size, _, _ in VARIANTS.values())
+    with Image.open(source) as original:
+        # lets the JPEG decoder scale by 1/2 to 1/8 instead of decoding
+        # every pixel, a no-op for other formats
+        original.draft("RGB", largest)
+        image = original.convert("RGB")
+
+    for variant, target in targets.items():
+        size, image_format, _ = VARIANTS[variant]
+        image.thumbnail(size, Image.LANCZOS)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        image.save(target, image_format, quality=85)
+
+
+def get_executor():
+    """Return the process pool shared by this worker, created lazily"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS
+        )
+    return _executor
+
+
+def _submit(function, *args):
+    """Submit to the pool, replacing it once if a dead worker broke it"""
+    global _executor
+    try:
+        return get_executor().submit(function, *args)
+    except BrokenProcessPool:
+        # e.g. a worker was killed for memory, the pool takes no more work
+        logger.warning("Recipe image pool broken, starting a new one")
+        _executor.shutdown(wait=False)
+        _executor = None
+        return get_executor().submit(function, *args)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            "Recipe image variants failed", exc_info=future.exception()
+        )
+
+
+def schedule_variants(name):
+    """Queue variant generation for a stored image and return at once"""
+    targets = {
+        variant: default_storage.path(variant_name(name, variant))
+        for variant in VARIANTS
+    }
+    if all(os.path.exists(target) for target in targets.values()):
+        # identical content was uploaded before, its variants are shared
+        return None
+    try:
+        future = _submit(
+            generate_variants, default_storage.path(name), targets
+        )
+    except Exception:
+        # the original is already saved, generate_image_variants can
+        # fill in the variants later
+        logger.exception("Unable to schedule recipe image variants")
+        return None
+    future.add_done_callback(_log_failure)
+    return future
@@ -0,0 +1,133 @@
+import json
+
+from rest_framework import serializers as drf_serializers
+
+from core.models import Ingredient, Tag, normalize_name
+from recipe import serializers
+
+# relation -> model whose names an import line lists
+RELATIONS = {"ingredients": Ingredient, "tags": Tag}
+# names looked up per query, under SQLite's 999 parameter limit
+NAME_CHUNK_SIZE = 500
+
+
+def read_lines(stream, max_bytes):
+    """Yield each line of a byte stream, None for one over max_bytes
+
+    Reads a line at a time, so the whole body is never held in memory.
+    """
+    while True:
+        line = stream.readline(max_bytes + 1)
+        if not line:
+            return
+        if len(line) > max_bytes and not line.endswith(b"\n"):
+            # discard the rest of the overlong line
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_bytes + 1)
+            yield None
+            continue
+        yield line
+
+
+class RecipeImport:
+    """Create recipes from NDJSON lines in transactional batches
+
+    Lines are validated on their own, without queries. Each batch resolves
+    the tag & ingredient names not seen earlier in the import with one
+    get_or_create_many() per relation, then bulk inserts its recipes.
+    Invalid lines are skipped & reported by line number.
+    """
+
+    # longest accepted line, in bytes
+    max_line_bytes = 64 * 1024
+    # errors listed in the summary, the rest are only counted
+    max_errors = 100
+
+    def __init__(self, request, batch_size):
+        self.user = request.user
+        self.batch_size = batch_size
+        self.validator = serializers.RecipeImportSerializer()
+        self.writer = serializers.RecipeBulkSerializer(
+            many=True, context={"request": request}
+        )
+        # relation -> {normalized name: ID}, filled as batches are written
+        self.ids = {name: {} for name in RELATIONS}
+        self.pending = []
+        self.summary = {
+            "lines": 0,
+            "created": 0,
+            "failed": 0,
+            "batches": 0,
+            "errors": [],
+        }
+
+    def run(self, stream):
+        """Import every line of the stream & return the summary"""
+        for number, line in enumerate(
+            read_lines(stream, self.max_line_bytes), 1
+        ):
+            if line is not None and not line.strip():
+                continue
+            self.summary["lines"] += 1
+            try:
+                self.pending.append(self.validate(line))
+            except drf_serializers.ValidationError as exc:
+                self.fail(number, exc.detail)
+                continue
+            if len(self.pending) == self.batch_size:
+                self.write()
+        if self.pending:
+            self.write()
+        return self.summary
+
+    def validate(self, line):
+        """Return the validated attributes of one line"""
+        if line is None:
+            raise drf_serializers.ValidationError(
+                f"Ensure lines have at most {self.max_line_bytes} bytes."
+            )
+        try:
+            data = json.loads(line.decode("utf-8"))
+        except ValueError:
+            raise drf_serializers.ValidationError("Invalid JSON.")
+        if not isinstance(data, dict):
+            raise drf_serializers.ValidationError("Expected a JSON object.")
+        return self.validator.run_validation(data)
+
+    def fail(self, number, detail):
+        self.summary["failed"] += 1
+        if len(self.summary["errors"]) < self.max_errors:
+            self.summary["errors"].append({"line": number, "errors": detail})
+
+    def write(self):
+        """Resolve the pending lines' names to IDs & insert their recipes"""
+        for name, model in RELATIONS.items():
+            ids = self.ids[name]
+            unseen = {}
+            for attrs in self.pending:
+                for value in attrs.get(name, []):
+                    key = normalize_name(value)
+                    if key not in ids:
+                        unseen.setdefault(key, value)
+            unseen = list(unseen.values())
+            for start in range(0, len(unseen), NAME_CHUNK_SIZE):
+                end = start + NAME_CHUNK_SIZE
+                found = model.objects.get_or_create_many(
+                    self.user, unseen[start:end]
+                )
+                ids.update((key, obj.id) for key, obj in found.items())
+
+        items = []
+        for attrs in self.pending:
+            item = dict(attrs, user=self.user)
+            for name in RELATIONS:
+                item[name] = [
+                    self.ids[name][normalize_name(value)]
+                    for value in attrs.get(name, [])
+                ]
+            items.append(item)
+        self.writer.create(items)
+
+        self.summary["created"] += len(items)
+        self.summary["batches"] += 1
+        self.pending = []
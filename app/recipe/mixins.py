@@ -0,0 +1,102 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import get_data_version
+
+
+class CachedListMixin:
+    """Serve list responses from the cache until the user's data changes"""
+
+    def list_cache_key(self, request):
+        """Return the cache key for this user, endpoint & query params"""
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        url = f"{request.get_host()}{request.path}?{query}"
+        return "list:{}:{}:{}".format(
+            request.user.pk,
+            get_data_version(request.user.pk),
+            hashlib.md5(url.encode()).hexdigest(),
+        )
+
+    def list(self, request, *args, **kwargs):
+        # the version is read before the queryset so a concurrent write
+        # can only ever make this entry unreachable, never stale
+        key = self.list_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        return response
+
+
+class ConditionalGetMixin:
+    """Answer If-None-Match / If-Modified-Since with 304 Not Modified"""
+
+    def conditional_response(self, request, last_modified, state, view):
+        """Return 304 if the client is up to date, otherwise call view"""
+        # the path includes filters & cursors, different pages differ
+        etag = '"{}"'.format(
+            hashlib.md5(
+                "|".join(
+                    (
+                        request.get_full_path(),
+                        request.accepted_media_type,
+                        str(last_modified),
+                        str(state),
+                    )
+                ).encode()
+            ).hexdigest()
+        )
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = view()
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # deletes change the count, every other write bumps updated_at.
+        # Deletes don't move Max(updated_at) forward, so lists revalidate
+        # by ETag alone, without a Last-Modified for If-Modified-Since
+        state = self.queryset.filter(user=request.user).aggregate(
+            last_modified=Max("updated_at"), count=Count("id")
+        )
+        return self.conditional_response(
+            request,
+            None,
+            (state["last_modified"], state["count"]),
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+
+class ValuesListMixin:
+    """List objects through the serializer's values() read path"""
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        queryset = serializer.read_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.read_rows(page))
+
+        return Response(serializer.read_rows(queryset))
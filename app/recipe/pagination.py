@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes ordered by primary key"""
+
+    ordering = "id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination for tags & ingredients ordered by name"""
+
+    ordering = ("-name", "id")
+
+
+class RecipeSearchPagination(PageNumberPagination):
+    """Page numbers over ranked search results, without counting matches"""
+
+    ordering = ("-search_rank", "id")
+    page_size = RecipeCursorPagination.page_size
+    page_size_query_param = "page_size"
+    max_page_size = RecipeCursorPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        # one extra row tells whether there is a next page
+        offset = (self.page_number - 1) * self.page_size
+        rows = list(
+            queryset.order_by(*self.ordering)[
+                offset:offset + self.page_size + 1
+            ]
+        )
+        self.has_next = len(rows) > self.page_size
+        return rows[: self.page_size]
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.page_query_param, self.page_number + 1
+        )
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.page_query_param, self.page_number - 1
+        )
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# joins the names of a recipe's tags or ingredients in one CSV cell
+CSV_LIST_SEPARATOR = "|"
+
+
+def _json_line(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False) + "\n"
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON, one object per line"""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a single response body, e.g. an error, as one line"""
+        return _json_line(data).encode(self.charset)
+
+    def stream(self, chunks):
+        """Yield the lines of each chunk of objects as one string"""
+        for chunk in chunks:
+            yield "".join(_json_line(item) for item in chunk)
+
+
+class CSVRenderer(BaseRenderer):
+    """Comma separated values of the recipe columns"""
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+    fields = (
+        "id",
+        "title",
+        "price",
+        "time_minutes",
+        "link",
+        "tags",
+        "ingredients",
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a single response body, e.g. an error, as one row"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if isinstance(data, dict):
+            writer.writerow(data)
+            writer.writerow(data.values())
+        else:
+            writer.writerow([data])
+        return out.getvalue().encode(self.charset)
+
+    def stream(self, chunks):
+        """Yield the header, then the rows of each chunk of recipes"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(self.fields)
+        # sent before the first query, so the download starts at once
+        yield out.getvalue()
+        for chunk in chunks:
+            out.seek(0)
+            out.truncate()
+            for item in chunk:
+                writer.writerow(self.row(item))
+            yield out.getvalue()
+
+    def row(self, item):
+        values = []
+        for name in self.fields:
+            value = item.get(name)
+            if isinstance(value, list):
+                value = CSV_LIST_SEPARATOR.join(obj["name"] for obj in value)
+            values.append(value)
+        return values
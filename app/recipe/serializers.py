@@ -1,8 +1,227 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, connections, transaction
+from django.db.models import IntegerField, OuterRef, Subquery
+from django.utils import timezone
+from PIL import Image
+
 from rest_framework import serializers
-from core.models import Ingredient, Recipe, Tag
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core.cache import bump_data_version
+from core.models import Ingredient, Recipe, SyncSequence, Tag
+from core.search import refresh_search_text
+from recipe import images
+
+
+# fields rendering related objects, read with a query per relation
+RELATION_FIELDS = (serializers.ManyRelatedField, serializers.ListSerializer)
+
+
+class ValuesReadMixin:
+    """Render many objects from values() rows, without model instances
+
+    Output equals to_representation() of each instance with related
+    objects in primary key order. Method fields named in field_columns are
+    computed from that column by read_<name>(). Related primary keys &
+    nested serializers load with one grouped query per relation, or an
+    ArrayAgg subquery of primary keys on PostgreSQL.
+    """
+
+    # method field -> the model column it is computed from
+    field_columns = {}
+
+    def read_queryset(self, queryset):
+        """Return queryset.values() with the columns the fields need"""
+        pk = self.Meta.model._meta.pk.attname
+        columns = dict.fromkeys([pk, *self._read_columns()])
+        annotations = {}
+        if connections[queryset.db].vendor == "postgresql":
+            for name, field in self._read_relations():
+                if isinstance(field, serializers.ManyRelatedField):
+                    annotations[_ids_key(name)] = self._id_array(field.source)
+        return queryset.prefetch_related(None).values(*columns, **annotations)
+
+    def read_rows(self, rows):
+        """Return the representation of each row of read_queryset()"""
+        rows = list(rows)
+        pk = self.Meta.model._meta.pk.attname
+        related = {}
+        for name, field in self._read_relations():
+            if rows and _ids_key(name) in rows[0]:
+                continue
+            child = getattr(field, "child", None)
+            related[name] = self._load_related(
+                field.source,
+                [row[pk] for row in rows],
+                child._read_columns() if child else (),
+            )
+
+        readers = []
+        for name, field in self.fields.items():
+            if name in related:
+                readers.append(
+                    (name, self._group_reader(field, related[name], pk))
+                )
+            elif _ids_key(name) in (rows[0] if rows else ()):
+                readers.append((name, _array_reader(_ids_key(name))))
+            else:
+                readers.append((name, self._column_reader(name, field)))
+
+        return [{name: read(row) for name, read in readers} for row in rows]
+
+    def _read_columns(self):
+        columns = []
+        for name, field in self.fields.items():
+            if isinstance(field, serializers.SerializerMethodField):
+                columns.append(self.field_columns[name])
+            elif not isinstance(field, RELATION_FIELDS):
+                columns.append(field.source)
+        return columns
+
+    def _read_relations(self):
+        return [
+            (name, field)
+            for name, field in self.fields.items()
+            if isinstance(field, RELATION_FIELDS)
+        ]
+
+    def _column_reader(self, name, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            column = self.field_columns[name]
+            method = getattr(self, f"read_{name}")
+            return lambda row: method(row[column])
+
+        column = field.source
+        to_representation = field.to_representation
+        return lambda row: (
+            None if row[column] is None else to_representation(row[column])
+        )
+
+    def _group_reader(self, field, related, pk):
+        child = getattr(field, "child", None)
+        if child is None:
+            return lambda row: related.get(row[pk], [])
+        columns = child._read_columns()
+        readers = [
+            (name, child._column_reader(name, child_field))
+            for name, child_field in child.fields.items()
+        ]
+        return lambda row: [
+            {name: read(dict(zip(columns, values))) for name, read in readers}
+            for values in related.get(row[pk], [])
+        ]
+
+    def _id_array(self, relation):
+        """Return a subquery of an object's related primary keys"""
+        from django.contrib.postgres.aggregates import ArrayAgg
+        from django.contrib.postgres.fields import ArrayField
+
+        field = self.Meta.model._meta.get_field(relation)
+        through = field.remote_field.through
+        source = field.m2m_column_name()
+        ids = (
+            through.objects.filter(**{source: OuterRef("pk")})
+            .order_by()
+            .values(source)
+            .annotate(ids=ArrayAgg(field.m2m_reverse_name()))
+            .values("ids")
+        )
+        return Subquery(ids, output_field=ArrayField(IntegerField()))
+
+    def _load_related(self, relation, ids, columns):
+        """Map each primary key to its related keys, or column tuples"""
+        field = self.Meta.model._meta.get_field(relation)
+        through = field.remote_field.through
+        source, target = field.m2m_column_name(), field.m2m_reverse_name()
+        values = [target]
+        if columns:
+            target_field = field.m2m_reverse_field_name()
+            values = [f"{target_field}__{column}" for column in columns]
+
+        related = {}
+        features = connections[through.objects.db].features
+        batch_size = features.max_query_params or len(ids) or 1
+        for start in range(0, len(ids), batch_size):
+            rows = (
+                through.objects.filter(
+                    **{f"{source}__in": ids[start:start + batch_size]}
+                )
+                .order_by(target)
+                .values_list(source, *values)
+            )
+            for key, *value in rows:
+                related.setdefault(key, []).append(
+                    tuple(value) if columns else value[0]
+                )
+        return related
+
+
+def _ids_key(name):
+    """Return the values() key of an aggregated primary key array"""
+    return f"{name}_ids_array"
 
 
-class TagSerializer(serializers.ModelSerializer):
+def _array_reader(key):
+    return lambda row: sorted(row[key] or ())
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    """Many primary keys checked together with one id__in query per batch
+
+    Reports every submitted key the requesting user doesn't own.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                pks.append(pk_field.to_python(item))
+            except DjangoValidationError:
+                child.fail("incorrect_type", data_type=type(item).__name__)
+        pks = list(dict.fromkeys(pks))
+
+        found = {}
+        batch_size = connections[queryset.db].features.max_query_params
+        batch_size = batch_size or len(pks) or 1
+        for start in range(0, len(pks), batch_size):
+            batch = queryset.filter(pk__in=pks[start:start + batch_size])
+            found.update((obj.pk, obj) for obj in batch)
+
+        missing = [pk for pk in pks if pk not in found]
+        if missing:
+            message = child.error_messages["does_not_exist"]
+            raise serializers.ValidationError(
+                [message.format(pk_value=pk) for pk in missing],
+                code="does_not_exist",
+            )
+        return [found[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key of an object owned by the requesting user"""
+
+    def get_queryset(self):
+        user = self.context["request"].user
+        return super().get_queryset().filter(user=user)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserManyRelatedField(**list_kwargs)
+
+
+class TagSerializer(ValuesReadMixin, serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
@@ -11,7 +230,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ValuesReadMixin, serializers.ModelSerializer):
     """Serializer for ingredient object"""
 
     class Meta:
@@ -20,15 +239,31 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ("id",)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeAttrBulkSerializer(serializers.Serializer):
+    """Serializer for a list of tag or ingredient names"""
+
+    # untrimmed, so the response can echo each name exactly as it was sent
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255, trim_whitespace=False),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+    def validate_names(self, value):
+        """Reject names that are only whitespace"""
+        if not all(name.strip() for name in value):
+            raise serializers.ValidationError("Names may not be blank.")
+        return value
+
+
+class RecipeSerializer(ValuesReadMixin, serializers.ModelSerializer):
     """Serializer for recipe object"""
 
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True, queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
+    tags = UserPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -40,9 +275,57 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients",
             "tags",
             "link",
+            "image_variants",
         )
         read_only_fields = ("id",)
 
+    # nested serializers that ?expand= swaps in for primary key lists
+    expandable_fields = {
+        "ingredients": IngredientSerializer,
+        "tags": TagSerializer,
+    }
+    field_columns = {"image_variants": "image"}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        """Expand the named relations & keep only the given fields"""
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](
+                many=True, read_only=True
+            )
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                del self.fields[name]
+
+    def update(self, instance, validated_data):
+        """Update a recipe, adding & removing only the changed relations"""
+        relations = {
+            name: validated_data.pop(name)
+            for name in self.expandable_fields
+            if name in validated_data
+        }
+        instance = super().update(instance, validated_data)
+        for name, objs in relations.items():
+            manager = getattr(instance, name)
+            current = set(manager.values_list("pk", flat=True))
+            removed = current - {obj.pk for obj in objs}
+            if removed:
+                manager.remove(*removed)
+            added = [obj for obj in objs if obj.pk not in current]
+            if added:
+                manager.add(*added)
+        return instance
+
+    def get_image_variants(self, obj):
+        """Return the resized image URLs, None without an image"""
+        return self.read_image_variants(obj.image.name)
+
+    def read_image_variants(self, name):
+        """Return the resized image URLs of a stored image name"""
+        if not name:
+            return None
+        return images.variant_urls(name)
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer a recipe detail"""
@@ -51,10 +334,218 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """Validate and insert many recipes with a fixed number of queries"""
+
+    max_items = 1000
+    batch_size = 500
+
+    def to_internal_value(self, data):
+        """Validate items, then check all related IDs in one query each"""
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        if len(data) > self.max_items:
+            raise serializers.ValidationError(
+                {
+                    "non_field_errors": [
+                        f"Ensure this list has at most {self.max_items} items."
+                    ]
+                }
+            )
+
+        items, errors = [], []
+        for item in data:
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append({})
+                errors.append(exc.detail)
+
+        user = self.context["request"].user
+        for name, model in (("ingredients", Ingredient), ("tags", Tag)):
+            requested = {pk for item in items for pk in item.get(name, [])}
+            existing = set(
+                model.objects.filter(user=user, id__in=requested).values_list(
+                    "id", flat=True
+                )
+            )
+            for index, item in enumerate(items):
+                missing = [
+                    pk for pk in item.get(name, []) if pk not in existing
+                ]
+                if missing:
+                    errors[index][name] = [
+                        f'Invalid pk "{pk}" - object does not exist.'
+                        for pk in missing
+                    ]
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return items
+
+    def create(self, validated_data):
+        """Bulk insert the recipes, then each M2M through table"""
+        recipes = []
+        related = {"ingredients": [], "tags": []}
+        for attrs in validated_data:
+            attrs = dict(attrs)
+            for name in related:
+                related[name].append(attrs.pop(name, []))
+            recipes.append(Recipe(**attrs))
+
+        with transaction.atomic():
+            if connection.features.can_return_ids_from_bulk_insert:
+                sequence = SyncSequence.objects.next_value(
+                    self.context["request"].user.pk
+                )
+                for recipe in recipes:
+                    recipe.sync_sequence = sequence
+                Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+            else:
+                # backend can't hand back primary keys from a bulk insert
+                for recipe in recipes:
+                    recipe.save()
+
+            for name, ids_per_recipe in related.items():
+                field = Recipe._meta.get_field(name)
+                through = field.remote_field.through
+                column = field.m2m_reverse_name()
+                through.objects.bulk_create(
+                    [
+                        through(recipe_id=recipe.id, **{column: pk})
+                        for recipe, ids in zip(recipes, ids_per_recipe)
+                        for pk in dict.fromkeys(ids)
+                    ],
+                    batch_size=self.batch_size,
+                )
+                # m2m_changed isn't sent for direct through table inserts
+                assigned = {pk for ids in ids_per_recipe for pk in ids}
+                if assigned:
+                    field.related_model.objects.filter(
+                        id__in=assigned
+                    ).update(updated_at=timezone.now())
+
+            refresh_search_text(pk__in=[recipe.id for recipe in recipes])
+
+        # bulk inserts don't send the signals that invalidate cached lists
+        bump_data_version(self.context["request"].user.pk)
+        return recipes
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializer for one item of a bulk recipe create"""
+
+    # plain IDs, checked in bulk by RecipeBulkListSerializer
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+    class Meta:
+        model = Recipe
+        fields = tuple(
+            name
+            for name in RecipeSerializer.Meta.fields
+            if name != "image_variants"
+        )
+        read_only_fields = ("id",)
+        list_serializer_class = RecipeBulkListSerializer
+
+
+class RecipeAttrNameField(serializers.CharField):
+    """Name of a tag or ingredient, also read from {"name": ...} objects"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = data.get("name")
+        return super().to_internal_value(data)
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Serializer for one line of an import, naming tags & ingredients
+
+    Validation runs no queries, names are resolved a batch at a time.
+    """
+
+    ingredients = serializers.ListField(
+        child=RecipeAttrNameField(max_length=255), required=False
+    )
+    tags = serializers.ListField(
+        child=RecipeAttrNameField(max_length=255), required=False
+    )
+
+    class Meta:
+        model = Recipe
+        fields = RecipeBulkSerializer.Meta.fields
+        read_only_fields = ("id",)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Serializer for the recipe IDs of a batch get, at most max_ids"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
+    )
+
+    def validate_ids(self, value):
+        """Drop repeated IDs, keeping the first position of each"""
+        ids = list(dict.fromkeys(value))
+        max_ids = self.context["max_ids"]
+        if len(ids) > max_ids:
+            raise serializers.ValidationError(
+                f"Ensure this list has at most {max_ids} distinct IDs."
+            )
+        return ids
+
+
+class RecipeImageField(serializers.ImageField):
+    """Image field that rejects oversized uploads from the header alone"""
+
+    default_error_messages = {
+        "too_large": "Image files may be at most {max_bytes} bytes.",
+        "too_many_pixels": "Images may have at most {max_pixels} pixels.",
+    }
+
+    def to_internal_value(self, data):
+        if hasattr(data, "read"):
+            max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+            if data.size > max_bytes:
+                self.fail("too_large", max_bytes=max_bytes)
+            try:
+                # open() only parses the header, pixels are decoded lazily.
+                # Not closed: that would close the uploaded file too
+                width, height = Image.open(data).size
+            except Exception:
+                self.fail("invalid_image")
+            finally:
+                data.seek(0)
+            if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                self.fail(
+                    "too_many_pixels",
+                    max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS,
+                )
+
+        return super().to_internal_value(data)
+
+
 class RecipeImageSerializer(RecipeSerializer):
     """Serializer for uploading images to recipes"""
 
+    image = RecipeImageField(required=False, allow_null=True)
+
     class Meta:
         model = Recipe
-        fields = ("id", "image")
+        fields = ("id", "image", "image_variants")
         read_only_fields = ("id",)
+
+    def save(self, **kwargs):
+        """Save the original, then resize it in the background"""
+        recipe = super().save(**kwargs)
+        if recipe.image:
+            name = recipe.image.name
+            transaction.on_commit(lambda: images.schedule_variants(name))
+        return recipe
@@ -0,0 +1,170 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.views import ChangesView
+
+CHANGES_URL = reverse("recipe:changes")
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {"title": "Sample title", "price": 5.00, "time_minutes": 10}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicChangesApiTests(TestCase):
+    """Test the unauthenticated changes feed"""
+
+    def test_login_required(self):
+        """Test that login is required for the changes feed"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateChangesApiTests(TestCase):
+    """Test the changes feed of an authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@foobar.com", "pass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since=None):
+        params = {} if since is None else {"since": since}
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_first_sync_returns_everything(self):
+        """Test a feed without a cursor lists all of the user's objects"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="Dal")
+        recipe = sample_recipe(self.user, title="Tarka dal")
+        recipe.tags.add(tag)
+        other = get_user_model().objects.create_user("o@foobar.com", "pw")
+        Tag.objects.create(user=other, name="Secret")
+
+        data = self.changes()
+
+        self.assertEqual(data["tags"], [{"id": tag.id, "name": "Vegan"}])
+        self.assertEqual(
+            data["ingredients"], [{"id": ingredient.id, "name": "Dal"}]
+        )
+        self.assertEqual([r["id"] for r in data["recipes"]], [recipe.id])
+        self.assertEqual(data["recipes"][0]["tags"], [tag.id])
+        self.assertEqual(
+            data["deleted"], {"tags": [], "ingredients": [], "recipes": []}
+        )
+        self.assertFalse(data["more"])
+
+    def test_changes_since_cursor(self):
+        """Test only objects changed or deleted after the cursor return"""
+        kept = sample_recipe(self.user, title="Kept")
+        edited = sample_recipe(self.user, title="Edited")
+        deleted = sample_recipe(self.user, title="Deleted")
+        cursor = self.changes()["cursor"]
+
+        self.client.patch(detail_url(edited.id), {"title": "Edited again"})
+        self.client.delete(detail_url(deleted.id))
+        tag = Tag.objects.create(user=self.user, name="New")
+        data = self.changes(cursor)
+
+        self.assertEqual(
+            [r["title"] for r in data["recipes"]], ["Edited again"]
+        )
+        self.assertEqual(data["tags"], [{"id": tag.id, "name": "New"}])
+        self.assertEqual(data["deleted"]["recipes"], [deleted.id])
+        self.assertGreater(data["cursor"], cursor)
+        self.assertNotIn(kept.id, [r["id"] for r in data["recipes"]])
+
+        unchanged = self.changes(data["cursor"])
+        self.assertEqual(unchanged["recipes"], [])
+        self.assertEqual(unchanged["cursor"], data["cursor"])
+
+    def test_relation_changes_reported(self):
+        """Test recipes whose tags change or are deleted are reported"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        tagged = sample_recipe(self.user, title="Tagged")
+        untagged = sample_recipe(self.user, title="Untagged")
+        tagged.tags.add(tag)
+        cursor = self.changes()["cursor"]
+
+        untagged.tags.add(tag)
+        data = self.changes(cursor)
+        self.assertEqual([r["id"] for r in data["recipes"]], [untagged.id])
+        self.assertEqual(data["tags"], [])
+
+        tag_id = tag.id
+        tag.delete()
+        data = self.changes(data["cursor"])
+        self.assertEqual(
+            sorted(r["id"] for r in data["recipes"]),
+            [tagged.id, untagged.id],
+        )
+        self.assertEqual(data["recipes"][0]["tags"], [])
+        self.assertEqual(data["deleted"]["tags"], [tag_id])
+
+    @patch.object(ChangesView, "page_size", 2)
+    def test_changes_paged_by_cursor(self):
+        """Test long feeds continue from the returned cursor"""
+        recipes = [sample_recipe(self.user, title=f"R{n}") for n in range(5)]
+        deleted_id = recipes[0].id
+        recipes[0].delete()
+
+        seen, deleted, pages, cursor = [], [], 0, 0
+        while True:
+            data = self.changes(cursor)
+            pages += 1
+            seen += [r["id"] for r in data["recipes"]]
+            deleted += data["deleted"]["recipes"]
+            cursor = data["cursor"]
+            if not data["more"]:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [recipe.id for recipe in recipes[1:]])
+        self.assertEqual(deleted, [deleted_id])
+
+    def test_page_keeps_one_change_whole(self):
+        """Test rows sharing a sequence number never split over pages"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipes = [sample_recipe(self.user, title=f"R{n}") for n in range(3)]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        cursor = self.changes()["cursor"]
+        tag_id = tag.id
+        # one change numbering every recipe losing the tag
+        tag.delete()
+
+        with patch.object(ChangesView, "page_size", 2):
+            first = self.changes(cursor)
+            second = self.changes(first["cursor"])
+
+        self.assertEqual(len(first["recipes"]), 3)
+        self.assertTrue(first["more"])
+        self.assertEqual(second["recipes"], [])
+        self.assertEqual(second["deleted"]["tags"], [tag_id])
+        self.assertFalse(second["more"])
+
+    def test_invalid_cursor(self):
+        """Test cursors must be non-negative integers"""
+        for since in ("abc", "-1"):
+            res = self.client.get(CHANGES_URL, {"since": since})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETag / Last-Modified revalidation of recipe endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "etag@foobar.com", "pass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Ramen", price=9.00, time_minutes=30
+        )
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304"""
+        res = self.client.get(RECIPE_URL)
+        self.assertNotIn("Last-Modified", res)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+
+    def test_list_modified_after_update(self):
+        """Test changing a recipe makes the old ETag stale"""
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        self.recipe.title = "Tonkotsu ramen"
+        self.recipe.save()
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_list_modified_after_delete(self):
+        """Test deleting a tag invalidates the tag list ETag"""
+        tag = Tag.objects.create(user=self.user, name="Noodles")
+        Tag.objects.create(user=self.user, name="Soup")
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        tag.delete()
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_ignores_if_modified_since_after_delete(self):
+        """Test a delete isn't hidden from If-Modified-Since revalidation"""
+        Recipe.objects.create(
+            user=self.user, title="Udon", price=8.00, time_minutes=20
+        )
+        since = http_date()
+
+        self.recipe.delete()
+        res = self.client.get(RECIPE_URL, HTTP_IF_MODIFIED_SINCE=since)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_detail_if_modified_since(self):
+        """Test the detail endpoint honours If-Modified-Since"""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        res = self.client.get(
+            detail_url(self.recipe.id),
+            HTTP_IF_MODIFIED_SINCE=res["Last-Modified"],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_m2m_change_touches_recipe(self):
+        """Test adding a tag changes the recipe detail ETag"""
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Hot"))
+        res = self.client.get(
+            detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["tags"]), 1)
+
+    def test_detail_of_other_user_not_found(self):
+        """Test revalidation doesn't leak other users' recipes"""
+        user2 = get_user_model().objects.create_user(
+            "other@foobar.com", "pass123"
+        )
+        recipe = Recipe.objects.create(
+            user=user2, title="Secret", price=1.00, time_minutes=1
+        )
+
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from recipe import images
+
+
+class ImageVariantTests(SimpleTestCase):
+    """Test generating resized variants of recipe images"""
+
+    def test_variant_name(self):
+        """Test variants are stored next to the original"""
+        name = images.variant_name("uploads/recipe/abc.png", "webp")
+        self.assertEqual(name, "uploads/recipe/variants/abc/webp.webp")
+
+    def test_generate_variants(self):
+        """Test each variant fits its bounding box and keeps the ratio"""
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "original.jpg")
+            Image.new("RGB", (1600, 800)).save(source, format="JPEG")
+            targets = {
+                variant: os.path.join(tmp, "out", variant)
+                for variant in images.VARIANTS
+            }
+
+            images.generate_variants(source, targets)
+
+            with Image.open(targets["medium"]) as medium:
+                self.assertEqual(medium.size, (600, 300))
+            with Image.open(targets["thumbnail"]) as thumbnail:
+                self.assertEqual(thumbnail.size, (150, 75))
+            with Image.open(targets["webp"]) as webp:
+                self.assertEqual(webp.format, "WEBP")
+
+    @patch("recipe.images.get_executor")
+    def test_schedule_variants_submits_to_pool(self, get_executor):
+        """Test scheduling hands absolute paths to the worker pool"""
+        images.schedule_variants("uploads/recipe/abc.jpg")
+
+        submit = get_executor.return_value.submit
+        function, source, targets = submit.call_args[0]
+        self.assertIs(function, images.generate_variants)
+        self.assertTrue(source.endswith("uploads/recipe/abc.jpg"))
+        self.assertEqual(set(targets), set(images.VARIANTS))
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1)
+    def test_broken_pool_replaced(self):
+        """Test a pool with a dead worker is replaced on the next submit"""
+        self.addCleanup(setattr, images, "_executor", None)
+        images._executor = None
+        with self.assertLogs("recipe.images", "ERROR"):
+            dead = images._submit(os._exit, 1)
+            self.assertIsNotNone(dead.exception())
+            dead.add_done_callback(images._log_failure)
+
+        with self.assertLogs("recipe.images", "WARNING"):
+            future = images._submit(abs, -1)
+
+        self.assertEqual(future.result(timeout=30), 1)
+        images._executor.shutdown()
+
+    @patch("recipe.images._submit", side_effect=RuntimeError("no pool"))
+    def test_schedule_failure_logged(self, submit):
+        """Test an upload isn't failed by a pool that can't take work"""
+        with self.assertLogs("recipe.images", "ERROR"):
+            future = images.schedule_variants("uploads/recipe/abc.jpg")
+
+        self.assertIsNone(future)
@@ -4,7 +4,7 @@ from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENT_URL = reverse("recipe:ingredient-list")
@@ -41,7 +41,7 @@ class PrivateIngredientAPITest(TestCase):
 
         ingredients = Ingredient.objects.all().order_by("-name")
         serizalizer = IngredientSerializer(ingredients, many=True)
-        self.assertEqual(res.data, serizalizer.data)
+        self.assertEqual(res.data["results"], serizalizer.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
     def test_ingredients_limited_to_user(self):
@@ -55,8 +55,8 @@ class PrivateIngredientAPITest(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], ingredient.name)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], ingredient.name)
 
     def test_create_ingredients_succesful(self):
         """Test that creating an ingredient succeeds"""
@@ -74,3 +74,35 @@ class PrivateIngredientAPITest(TestCase):
 
         res = self.client.post(INGREDIENT_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_ingredients_assigned_to_recipes(self):
+        """Test filtering ingredients by those assigned to recipes"""
+        ingredient_1 = Ingredient.objects.create(user=self.user, name="Apples")
+        ingredient_2 = Ingredient.objects.create(user=self.user, name="Lunch")
+        recipe = Recipe.objects.create(
+            title="Coriander eggs on toast",
+            time_minutes=10,
+            price=5.00,
+            user=self.user,
+        )
+        recipe.ingredients.add(ingredient_1)
+
+        res = self.client.get(INGREDIENT_URL, {"assigned_only": 1})
+
+        names = [item["name"] for item in res.data["results"]]
+        self.assertEqual(names, [ingredient_1.name])
+        self.assertNotIn(ingredient_2.name, names)
+
+    def test_retrieve_ingredients_assigned_unique(self):
+        """Test filtering ingredients by assigned returns unique items"""
+        ingredient = Ingredient.objects.create(user=self.user, name="Apples")
+        Ingredient.objects.create(user=self.user, name="Lunch")
+        for title in ("Pancakes", "Porridge"):
+            recipe = Recipe.objects.create(
+                title=title, time_minutes=5, price=3.00, user=self.user
+            )
+            recipe.ingredients.add(ingredient)
+
+        res = self.client.get(INGREDIENT_URL, {"assigned_only": 1})
+
+        self.assertEqual(len(res.data["results"]), 1)
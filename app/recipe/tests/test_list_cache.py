@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class ListCacheTests(TestCase):
+    """Test list responses are cached per user & data version"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "cache@foobar.com", "pass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """Test an unchanged list only runs the freshness aggregate"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        self.client.get(TAGS_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data["results"][0]["name"], "Vegan")
+
+    def test_write_invalidates_cached_list(self):
+        """Test creating a tag through the API shows up in the next list"""
+        self.client.get(TAGS_URL)
+
+        self.client.post(TAGS_URL, {"name": "Dessert"})
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_m2m_change_invalidates_cached_list(self):
+        """Test adding a tag to a recipe refreshes the cached recipe list"""
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", price=2.00, time_minutes=5
+        )
+        self.client.get(RECIPE_URL)
+
+        tag = Tag.objects.create(user=self.user, name="Winter")
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data["results"][0]["tags"], [tag.id])
+
+    def test_cache_keyed_by_query_params_and_user(self):
+        """Test different filters and users get separate entries"""
+        user2 = get_user_model().objects.create_user(
+            "other@foobar.com", "pass123"
+        )
+        Tag.objects.create(user=user2, name="Spicy")
+        Tag.objects.create(user=self.user, name="Mild")
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+        self.assertEqual(res.data["results"], [])
+
+        self.client.force_authenticate(user2)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data["results"][0]["name"], "Spicy")
@@ -0,0 +1,247 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+RECIPE_URL = reverse("recipe:recipe-list")
+BULK_URL = reverse("recipe:recipe-bulk-create")
+IMPORT_URL = reverse("recipe:recipe-import")
+CHANGES_URL = reverse("recipe:changes")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENT_URL = reverse("recipe:ingredient-list")
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def sample_recipe(user, index):
+    """Create a recipe with a few tags and ingredients attached"""
+    recipe = Recipe.objects.create(
+        user=user, title=f"Recipe {index}", price=5.00, time_minutes=10
+    )
+    for n in range(3):
+        recipe.tags.add(Tag.objects.create(user=user, name=f"Tag {index}{n}"))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=user, name=f"Ing {index}{n}")
+        )
+    return recipe
+
+
+class QueryBudgetTests(TestCase):
+    """Pin the number of SQL queries each endpoint is allowed to run"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "budget@foobar.com", "pass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_recipe_list_query_count_is_constant(self):
+        """Test listing recipes doesn't run a query per recipe"""
+        for index in range(5):
+            sample_recipe(self.user, index)
+
+        # freshness aggregate & recipes, with ID arrays on PostgreSQL or a
+        # grouped query each for ingredients & tags elsewhere
+        postgresql = connection.vendor == "postgresql"
+        with self.assertNumQueries(2 if postgresql else 4):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 5)
+        self.assertEqual(len(res.data["results"][0]["tags"]), 3)
+
+    def test_recipe_list_sparse_fields_query_count(self):
+        """Test ?fields= skips unrendered columns & relations"""
+        for index in range(5):
+            sample_recipe(self.user, index)
+
+        # freshness aggregate & recipes, no prefetches
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPE_URL, {"fields": "id,title"})
+
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("price", queries[1]["sql"])
+        self.assertEqual(set(res.data["results"][0]), {"id", "title"})
+
+    def test_recipe_list_expand_query_count(self):
+        """Test ?expand= nests tags & ingredients with one query each"""
+        for index in range(5):
+            sample_recipe(self.user, index)
+
+        # freshness aggregate, recipes, ingredients & tags
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URL, {"expand": "tags,ingredients"})
+
+        tags = res.data["results"][0]["tags"]
+        self.assertEqual(set(tags[0]), {"id", "name"})
+
+    def test_recipe_detail_query_count(self):
+        """Test retrieving a recipe prefetches nested objects"""
+        recipe = sample_recipe(self.user, 0)
+
+        # freshness lookup, recipe, ingredients & tags prefetches
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["ingredients"]), 3)
+
+    def test_recipe_batch_get_query_count_is_constant(self):
+        """Test a batch get reads all recipes with one query & prefetches"""
+        ids = [sample_recipe(self.user, index).id for index in range(5)]
+
+        # recipes, ingredients & tags prefetches
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                RECIPE_URL, {"ids": ",".join(map(str, ids + [999999]))}
+            )
+
+        self.assertEqual([r["id"] for r in res.data["results"]], ids)
+        self.assertEqual(len(res.data["results"][4]["tags"]), 3)
+
+    @skipUnlessDBFeature("can_return_ids_from_bulk_insert")
+    def test_recipe_bulk_create_query_count_is_constant(self):
+        """Test bulk creating recipes doesn't run queries per item"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="Tofu")
+
+        def payload(count):
+            return [
+                {
+                    "title": f"Recipe {index}",
+                    "time_minutes": 10,
+                    "price": "5.00",
+                    "tags": [tag.id],
+                    "ingredients": [ingredient.id],
+                }
+                for index in range(count)
+            ]
+
+        # 2 ID checks, savepoint pair, sequence number, 3 inserts, 2 touches
+        # of the related rows, search text refresh, 3 reads for the response
+        with self.assertNumQueries(14):
+            self.client.post(BULK_URL, payload(2), format="json")
+        with self.assertNumQueries(14):
+            res = self.client.post(BULK_URL, payload(20), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 20)
+
+    @skipUnlessDBFeature("can_return_ids_from_bulk_insert")
+    def test_recipe_import_query_count_is_constant(self):
+        """Test importing recipes doesn't run queries per line"""
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        def body(count):
+            return "".join(
+                json.dumps(
+                    {
+                        "title": f"Recipe {index}",
+                        "time_minutes": 10,
+                        "price": "5.00",
+                        "tags": ["vegan"],
+                        "ingredients": [f"Spice {index}"],
+                    }
+                )
+                + "\n"
+                for index in range(count)
+            )
+
+        for count in (2, 20):
+            # 2 name lookups, ingredient insert & 3 inserts in savepoints,
+            # each with a sequence number, 2 touches of the related rows,
+            # search text refresh
+            with self.assertNumQueries(15):
+                res = self.client.post(
+                    IMPORT_URL,
+                    body(count),
+                    content_type="application/x-ndjson",
+                )
+            self.assertEqual(res.data["created"], count)
+
+    def test_changes_query_count_follows_changes(self):
+        """Test the changes feed reads what changed, not the collection"""
+        recipes = [sample_recipe(self.user, index) for index in range(10)]
+        cursor = self.client.get(CHANGES_URL).data["cursor"]
+        recipes[3].title = "Changed"
+        recipes[3].save()
+
+        # counter, sequence numbers of 3 kinds & tombstones, changed
+        # recipes with ID arrays on PostgreSQL or grouped queries elsewhere
+        postgresql = connection.vendor == "postgresql"
+        with self.assertNumQueries(6 if postgresql else 8):
+            res = self.client.get(CHANGES_URL, {"since": cursor})
+
+        self.assertEqual(res.data["recipes"][0]["title"], "Changed")
+        self.assertEqual(len(res.data["recipes"][0]["tags"]), 3)
+        self.assertEqual(res.data["tags"], [])
+
+    def test_recipe_create_validates_ids_in_one_query(self):
+        """Test the tags of a new recipe are checked together"""
+        tags = [
+            Tag.objects.create(user=self.user, name=f"Tag {index}").id
+            for index in range(20)
+        ]
+
+        def tag_checks(count):
+            payload = {
+                "title": "Dal",
+                "time_minutes": 10,
+                "price": "5.00",
+                "ingredients": [],
+                "tags": tags[:count],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPE_URL, payload, format="json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return [
+                query["sql"]
+                for query in queries.captured_queries
+                if 'FROM "core_tag" WHERE' in query["sql"]
+            ]
+
+        self.assertEqual(len(tag_checks(2)), 1)
+        checks = tag_checks(20)
+        self.assertEqual(len(checks), 1)
+        self.assertIn('"core_tag"."id" IN (', checks[0])
+        self.assertIn('"core_tag"."user_id" = ', checks[0])
+
+    def test_ingredient_bulk_get_or_create_query_count(self):
+        """Test bulk get-or-create runs one lookup and one insert"""
+        Ingredient.objects.create(user=self.user, name="Salt")
+        names = ["salt"] + [f"Spice {index}" for index in range(20)]
+        url = reverse("recipe:ingredient-bulk-get-or-create")
+
+        # lookup, savepoint pair, sequence number, insert (+ re-read without
+        # returned IDs, where the number takes an update & a read)
+        returns_ids = connection.features.can_return_ids_from_bulk_insert
+        with self.assertNumQueries(5 if returns_ids else 7):
+            res = self.client.post(url, {"names": names}, format="json")
+
+        self.assertEqual(len(res.data), 21)
+
+    def test_tag_list_query_count(self):
+        """Test listing tags runs a freshness aggregate and one query"""
+        sample_recipe(self.user, 0)
+
+        with self.assertNumQueries(2):
+            self.client.get(TAGS_URL)
+
+    def test_ingredient_list_query_count(self):
+        """Test listing ingredients runs a freshness aggregate and one query"""
+        sample_recipe(self.user, 0)
+
+        with self.assertNumQueries(2):
+            self.client.get(INGREDIENT_URL)
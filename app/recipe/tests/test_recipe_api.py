@@ -1,18 +1,31 @@
+import csv
+import json
 import tempfile
 import os
+from unittest import skipUnless
+from unittest.mock import patch
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe, Tag
+from core.search import has_trigram
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet, _params_to_names
 
 RECIPE_URL = reverse("recipe:recipe-list")
+BULK_URL = reverse("recipe:recipe-bulk-create")
+EXPORT_URL = reverse("recipe:recipe-export")
+IMPORT_URL = reverse("recipe:recipe-import")
+BATCH_GET_URL = reverse("recipe:recipe-batch-get")
 
 
 def image_upload_url(recipe_id):
@@ -69,11 +82,11 @@ class PrivateRecipeAPITests(TestCase):
         sample_recipe(self.user, title="Beef Bourginon")
         sample_recipe(self.user)
         res = self.client.get(RECIPE_URL)
-        recipes = Recipe.objects.all().order_by("-id")
+        recipes = Recipe.objects.all().order_by("id")
         serializers = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializers.data)
+        self.assertEqual(res.data["results"], serializers.data)
 
     def test_recipes_limited_to_user(self):
         """Test retrieving recipes for user"""
@@ -88,8 +101,8 @@ class PrivateRecipeAPITests(TestCase):
         serializers = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializers.data)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"], serializers.data)
 
     def test_view_recipe_detail(self):
         """Test viewing a recipe detail"""
@@ -193,6 +206,592 @@ class PrivateRecipeAPITests(TestCase):
         ingredients = recipe.ingredients.all()
         self.assertEqual(len(ingredients), 0)
 
+    def test_create_recipe_with_unowned_ids_rejected(self):
+        """Test every tag the user doesn't own is reported"""
+        tag = sample_tag(user=self.user, name="Vegan")
+        other = get_user_model().objects.create_user("other@foobar.com", "pw")
+        other_tag = sample_tag(user=other, name="Secret")
+        payload = {
+            "title": "Tom Ka Yum",
+            "time_minutes": 120,
+            "price": "12.12",
+            "tags": [tag.id, other_tag.id, 999999, other_tag.id],
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tags"],
+            [
+                f'Invalid pk "{other_tag.id}" - object does not exist.',
+                'Invalid pk "999999" - object does not exist.',
+            ],
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_with_invalid_id_type(self):
+        """Test non-integer tag IDs are rejected"""
+        payload = {
+            "title": "Tom Ka Yum",
+            "time_minutes": 120,
+            "price": "12.12",
+            "tags": ["soup"],
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", res.data)
+
+    def test_update_changes_only_changed_relations(self):
+        """Test an update keeps the links to tags it still lists"""
+        recipe = sample_recipe(user=self.user)
+        kept, removed, added = (
+            sample_tag(user=self.user, name=name)
+            for name in ("Kept", "Removed", "Added")
+        )
+        recipe.tags.add(kept, removed)
+        through = Recipe.tags.through
+        link = through.objects.get(recipe=recipe, tag=kept).id
+
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"tags": [kept.id, added.id]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(res.data["tags"]), [kept.id, added.id])
+        self.assertEqual(through.objects.get(recipe=recipe, tag=kept).id, link)
+        self.assertFalse(through.objects.filter(tag=removed).exists())
+
+    def test_recipe_list_paginated_by_cursor(self):
+        """Test walking the recipe list with opaque cursors"""
+        recipes = [sample_recipe(self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPE_URL, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertIsNone(res.data["previous"])
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [recipes[0].id, recipes[1].id],
+        )
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]], [recipes[2].id]
+        )
+        self.assertIsNone(res.data["next"])
+        self.assertIsNotNone(res.data["previous"])
+
+    def test_recipe_page_size_capped(self):
+        """Test the requested page size can't exceed the maximum"""
+        for _ in range(3):
+            sample_recipe(self.user)
+
+        with patch.object(RecipeCursorPagination, "max_page_size", 2):
+            res = self.client.get(RECIPE_URL, {"page_size": 1000})
+
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_filter_recipes_by_tags(self):
+        """Test returning recipes with any of the specified tags"""
+        recipe_1 = sample_recipe(user=self.user, title="Thai veg curry")
+        recipe_2 = sample_recipe(user=self.user, title="Aubergine tahini")
+        recipe_3 = sample_recipe(user=self.user, title="Fish and chips")
+        tag_1 = sample_tag(user=self.user, name="Vegan")
+        tag_2 = sample_tag(user=self.user, name="Vegetarian")
+        recipe_1.tags.add(tag_1)
+        recipe_2.tags.add(tag_1, tag_2)
+
+        res = self.client.get(RECIPE_URL, {"tags": f"{tag_1.id},{tag_2.id}"})
+
+        ids = [r["id"] for r in res.data["results"]]
+        self.assertEqual(ids, [recipe_1.id, recipe_2.id])
+        self.assertNotIn(recipe_3.id, ids)
+
+    def test_filter_recipes_by_ingredients(self):
+        """Test returning recipes with specific ingredients"""
+        recipe_1 = sample_recipe(user=self.user, title="Posh beans on toast")
+        recipe_2 = sample_recipe(user=self.user, title="Chicken cacciatore")
+        recipe_1.ingredients.add(sample_ingredient(self.user, "Feta cheese"))
+        ingredient = sample_ingredient(self.user, "Chicken")
+        recipe_2.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPE_URL, {"ingredients": ingredient.id})
+
+        ids = [r["id"] for r in res.data["results"]]
+        self.assertEqual(ids, [recipe_2.id])
+
+    def test_filter_recipes_by_price_and_time(self):
+        """Test returning recipes below a maximum price and cooking time"""
+        cheap_quick = sample_recipe(self.user, price=5.00, time_minutes=10)
+        sample_recipe(self.user, price=5.00, time_minutes=90)
+        sample_recipe(self.user, price=50.00, time_minutes=10)
+
+        res = self.client.get(RECIPE_URL, {"max_price": "10", "max_time": 30})
+
+        ids = [r["id"] for r in res.data["results"]]
+        self.assertEqual(ids, [cheap_quick.id])
+
+    def test_filter_recipes_invalid_param(self):
+        """Test that malformed filter values are rejected"""
+        res = self.client.get(RECIPE_URL, {"tags": "1,abc"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URL, {"max_price": "cheap"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_recipes_non_finite_price(self):
+        """Test NaN & infinite prices are rejected as malformed"""
+        for value in ("NaN", "Infinity", "-inf", "sNaN"):
+            for param in ("min_price", "max_price"):
+                res = self.client.get(RECIPE_URL, {param: value})
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(param, res.data)
+
+    def test_search_recipes(self):
+        """Test searching recipe titles, tag and ingredient names"""
+        curry = sample_recipe(self.user, title="Chickpea curry")
+        stew = sample_recipe(self.user, title="Winter stew")
+        stew.tags.add(sample_tag(self.user, name="Curry night"))
+        salad = sample_recipe(self.user, title="Salad")
+        salad.ingredients.add(sample_ingredient(self.user, name="Chickpea"))
+
+        res = self.client.get(RECIPE_URL, {"search": "curry"})
+        ids = {r["id"] for r in res.data["results"]}
+        self.assertEqual(ids, {curry.id, stew.id})
+
+        res = self.client.get(RECIPE_URL, {"search": "chickpea curry"})
+        ids = [r["id"] for r in res.data["results"]]
+        self.assertEqual(ids[0], curry.id)
+        self.assertNotIn(stew.id, ids)
+
+    def test_search_follows_tag_and_ingredient_changes(self):
+        """Test renamed, removed & deleted tags update search results"""
+        recipe = sample_recipe(self.user, title="Toast")
+        tag = sample_tag(self.user, name="Breakfast")
+        ingredient = sample_ingredient(self.user, name="Butter")
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        def found(terms):
+            res = self.client.get(RECIPE_URL, {"search": terms})
+            return [r["id"] for r in res.data["results"]] == [recipe.id]
+
+        self.assertTrue(found("butter"))
+        tag.name = "Brunch"
+        tag.save()
+        self.assertTrue(found("brunch"))
+        self.assertFalse(found("breakfast"))
+        recipe.tags.clear()
+        self.assertFalse(found("brunch"))
+        ingredient.delete()
+        self.assertFalse(found("butter"))
+        recipe.title = "Crumpets"
+        recipe.save()
+        self.assertTrue(found("crumpets"))
+
+    def test_search_bulk_created_recipes(self):
+        """Test bulk created recipes are searchable by their tags"""
+        tag = sample_tag(user=self.user, name="Vegan")
+        payload = [{"title": "Dal", "time_minutes": 30, "price": "4.00"}]
+        payload[0]["tags"] = [tag.id]
+        self.client.post(BULK_URL, payload, format="json")
+
+        res = self.client.get(RECIPE_URL, {"search": "vegan"})
+
+        self.assertEqual([r["title"] for r in res.data["results"]], ["Dal"])
+
+    @skipUnless(connection.vendor == "postgresql", "trigram search")
+    def test_search_tolerates_typos(self):
+        """Test misspelt terms still match through trigram similarity"""
+        if not has_trigram(connection):
+            self.skipTest("pg_trgm is not installed")
+        recipe = sample_recipe(self.user, title="Chickpea curry")
+
+        res = self.client.get(RECIPE_URL, {"search": "chikpea curry"})
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipe.id])
+
+    def test_search_results_paginated(self):
+        """Test search results are paged by page number"""
+        for index in range(3):
+            sample_recipe(self.user, title=f"Pie {index}")
+
+        res = self.client.get(RECIPE_URL, {"search": "pie", "page_size": 2})
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIn("page=2", res.data["next"])
+        self.assertIsNone(res.data["previous"])
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertIsNone(res.data["next"])
+
+        res = self.client.get(RECIPE_URL, {"search": "pie", "page": 0})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_sparse_fields(self):
+        """Test ?fields= limits the fields of each listed recipe"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(sample_tag(self.user))
+
+        res = self.client.get(RECIPE_URL, {"fields": "id,title,tags"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["results"],
+            [
+                {
+                    "id": recipe.id,
+                    "title": recipe.title,
+                    "tags": [recipe.tags.get().id],
+                }
+            ],
+        )
+
+    def test_list_expand_relations(self):
+        """Test ?expand= nests tag objects instead of primary keys"""
+        recipe = sample_recipe(self.user)
+        tag = sample_tag(self.user)
+        ingredient = sample_ingredient(self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPE_URL, {"expand": "tags"})
+
+        item = res.data["results"][0]
+        self.assertEqual(item["tags"], [{"id": tag.id, "name": tag.name}])
+        self.assertEqual(item["ingredients"], [ingredient.id])
+
+    def test_detail_sparse_fields(self):
+        """Test ?fields= limits the fields of a recipe detail"""
+        recipe = sample_recipe(self.user)
+
+        res = self.client.get(
+            detail_url(recipe.id), {"fields": "title,image_variants"}
+        )
+
+        self.assertEqual(
+            res.data, {"title": recipe.title, "image_variants": None}
+        )
+
+    def test_field_params_parsed_once(self):
+        """Test ?fields= & ?expand= are parsed once per request"""
+        recipe = sample_recipe(self.user)
+
+        with patch(
+            "recipe.views._params_to_names", wraps=_params_to_names
+        ) as parse:
+            res = self.client.get(
+                detail_url(recipe.id), {"fields": "id,tags", "expand": "tags"}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(parse.call_count, 2)
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown ?fields= & ?expand= names are rejected"""
+        res = self.client.get(RECIPE_URL, {"fields": "id,secret"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPE_URL, {"expand": "title"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def export(self, **params):
+        """Return the status, content type & body of an export"""
+        res = self.client.get(EXPORT_URL, params)
+        body = b"".join(res.streaming_content).decode()
+        return res.status_code, res["Content-Type"], body
+
+    def test_export_ndjson(self):
+        """Test exporting streams one JSON line per recipe of the user"""
+        recipe = sample_recipe(self.user, title="Dal")
+        recipe.tags.add(sample_tag(self.user, "Vegan"))
+        recipe.ingredients.add(sample_ingredient(self.user, "Lentils"))
+        sample_recipe(self.user, title="Toast")
+        other = get_user_model().objects.create_user("other@foobar.com", "pw")
+        sample_recipe(other, title="Secret")
+
+        code, content_type, body = self.export()
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(content_type, "application/x-ndjson; charset=utf-8")
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([line["title"] for line in lines], ["Dal", "Toast"])
+        self.assertEqual(
+            lines[0]["tags"], [{"id": recipe.tags.get().id, "name": "Vegan"}]
+        )
+        self.assertEqual(lines[0]["ingredients"][0]["name"], "Lentils")
+        self.assertEqual(lines[0]["price"], "99.00")
+
+    def test_export_csv(self):
+        """Test exporting as CSV joins tag & ingredient names per cell"""
+        recipe = sample_recipe(self.user, title="Dal, spiced")
+        recipe.tags.add(sample_tag(self.user, "Vegan"))
+        recipe.tags.add(sample_tag(self.user, "Quick"))
+
+        code, content_type, body = self.export(format="csv")
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(content_type, "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], "Dal, spiced")
+        self.assertEqual(rows[0]["tags"], "Vegan|Quick")
+        self.assertEqual(rows[0]["ingredients"], "")
+
+    @patch.object(RecipeViewSet, "export_chunk_size", 2)
+    def test_export_loads_relations_per_chunk(self):
+        """Test relations load with one query per relation & chunk"""
+        tag = sample_tag(self.user)
+        for n in range(5):
+            sample_recipe(self.user, title=f"Recipe {n}").tags.add(tag)
+
+        with CaptureQueriesContext(connection) as queries:
+            code, _, body = self.export()
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(len(body.splitlines()), 5)
+        through = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "core_recipe_tags" in query["sql"]
+            and "core_recipe_ingredients" not in query["sql"]
+        ]
+        # 3 chunks of at most 2 recipes
+        self.assertEqual(len(through), 3)
+
+    def test_export_unknown_format(self):
+        """Test formats other than NDJSON & CSV aren't offered"""
+        res = self.client.get(EXPORT_URL, {"format": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def import_lines(self, *lines):
+        """Post lines as an NDJSON import, returning the response"""
+        body = "".join(
+            (line if isinstance(line, str) else json.dumps(line)) + "\n"
+            for line in lines
+        )
+        return self.client.post(
+            IMPORT_URL, body, content_type="application/x-ndjson"
+        )
+
+    def test_import_recipes(self):
+        """Test importing creates recipes, resolving names to objects"""
+        vegan = sample_tag(self.user, "Vegan")
+        other = get_user_model().objects.create_user("other@foobar.com", "pw")
+        sample_ingredient(other, "Lentils")
+
+        res = self.import_lines(
+            {
+                "title": "Dal",
+                "price": "4.50",
+                "time_minutes": 30,
+                "tags": ["  vegan", {"id": 9, "name": "Quick"}],
+                "ingredients": ["Lentils", "lentils"],
+            },
+            "",
+            {"title": "Toast", "price": "1.00", "time_minutes": 5},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,
+            {
+                "lines": 2,
+                "created": 2,
+                "failed": 0,
+                "batches": 1,
+                "errors": [],
+            },
+        )
+        dal = Recipe.objects.get(user=self.user, title="Dal")
+        self.assertEqual(
+            sorted(dal.tags.values_list("name", flat=True)), ["Quick", "Vegan"]
+        )
+        self.assertIn(vegan, dal.tags.all())
+        self.assertEqual(dal.ingredients.get().user, self.user)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_import_reports_line_errors(self):
+        """Test invalid lines are skipped & reported by line number"""
+        valid = {"title": "Dal", "price": "4.50", "time_minutes": 30}
+
+        with patch("recipe.imports.RecipeImport.max_line_bytes", 80):
+            res = self.import_lines(
+                valid,
+                "{not json",
+                {"price": "4.50", "time_minutes": 30},
+                "[1, 2]",
+                dict(valid, title="x" * 100),
+                dict(valid, tags=[""]),
+                valid,
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(res.data["failed"], 5)
+        errors = {item["line"]: item["errors"] for item in res.data["errors"]}
+        self.assertEqual(list(errors), [2, 3, 4, 5, 6])
+        self.assertEqual(errors[2], ["Invalid JSON."])
+        self.assertIn("title", errors[3])
+        self.assertEqual(errors[4], ["Expected a JSON object."])
+        self.assertEqual(errors[5], ["Ensure lines have at most 80 bytes."])
+        self.assertIn("tags", errors[6])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    @patch.object(RecipeViewSet, "import_batch_size", 2)
+    def test_import_in_batches(self):
+        """Test imports write in batches, reusing names across them"""
+        lines = [
+            {
+                "title": f"Recipe {n}",
+                "price": "1.00",
+                "time_minutes": 5,
+                "tags": ["Vegan"],
+            }
+            for n in range(5)
+        ]
+
+        res = self.import_lines(*lines)
+
+        self.assertEqual(res.data["created"], 5)
+        self.assertEqual(res.data["batches"], 3)
+        tag = Tag.objects.get(user=self.user)
+        self.assertEqual(tag.recipe_set.count(), 5)
+
+    def test_import_round_trips_export(self):
+        """Test an export imports back as the same recipes"""
+        recipe = sample_recipe(self.user, title="Dal", link="http://x.y")
+        recipe.tags.add(sample_tag(self.user, "Vegan"))
+        recipe.ingredients.add(sample_ingredient(self.user, "Lentils"))
+        _, _, body = self.export()
+
+        res = self.import_lines(*body.splitlines())
+
+        self.assertEqual(res.data["created"], 1)
+        copy = Recipe.objects.filter(user=self.user).latest("id")
+        self.assertNotEqual(copy.id, recipe.id)
+        self.assertEqual(copy.link, "http://x.y")
+        self.assertEqual(list(copy.tags.all()), list(recipe.tags.all()))
+        self.assertEqual(
+            list(copy.ingredients.all()), list(recipe.ingredients.all())
+        )
+
+    def test_import_requires_ndjson(self):
+        """Test imports only accept an NDJSON body"""
+        res = self.client.post(IMPORT_URL, [], format="json")
+
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    def test_batch_get_by_ids(self):
+        """Test ?ids= returns recipe details in order, listing missing IDs"""
+        first = sample_recipe(self.user, title="First")
+        second = sample_recipe(self.user, title="Second")
+        second.tags.add(sample_tag(self.user))
+        other = get_user_model().objects.create_user("o@foobar.com", "pw")
+        unowned = sample_recipe(other, title="Unowned")
+        ids = [second.id, unowned.id, first.id, second.id, 999999]
+
+        res = self.client.get(RECIPE_URL, {"ids": ",".join(map(str, ids))})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["results"],
+            RecipeDetailSerializer([second, first], many=True).data,
+        )
+        self.assertEqual(res.data["missing"], [unowned.id, 999999])
+
+    def test_batch_get_post(self):
+        """Test long ID lists can be sent in the body of a POST"""
+        recipes = [sample_recipe(self.user, title=f"R{n}") for n in range(3)]
+        ids = [recipe.id for recipe in reversed(recipes)]
+
+        res = self.client.post(BATCH_GET_URL, {"ids": ids}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data["results"]], ids)
+        self.assertEqual(res.data["missing"], [])
+
+    @patch.object(RecipeViewSet, "batch_get_max_ids", 2)
+    def test_batch_get_invalid_ids(self):
+        """Test batch gets reject bad, empty & too many IDs"""
+        for ids in ("1,abc", "", "1,2,3"):
+            res = self.client.get(RECIPE_URL, {"ids": ids})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("ids", res.data)
+
+        # repeated IDs count once
+        res = self.client.post(
+            BATCH_GET_URL, {"ids": [1, 1, 2]}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_create_recipes(self):
+        """Test creating several recipes in one request"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        payload = [
+            {"title": "Pad thai", "time_minutes": 20, "price": "8.50"},
+            {
+                "title": "Chorizo stew",
+                "time_minutes": 45,
+                "price": "6.00",
+                "tags": [tag.id],
+                "ingredients": [ingredient.id, ingredient.id],
+            },
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        titles = [recipe["title"] for recipe in res.data]
+        self.assertEqual(titles, ["Pad thai", "Chorizo stew"])
+        stew = Recipe.objects.get(user=self.user, title="Chorizo stew")
+        self.assertEqual(list(stew.tags.all()), [tag])
+        self.assertEqual(list(stew.ingredients.all()), [ingredient])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """Test invalid items are reported by position and nothing is saved"""
+        user2 = get_user_model().objects.create_user(
+            "user2@foobar.com", "pass234"
+        )
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {"title": "Fine", "time_minutes": 5, "price": "1.00"},
+            {"title": "", "time_minutes": 5, "price": "1.00"},
+            {
+                "title": "Borrowed tag",
+                "time_minutes": 5,
+                "price": "1.00",
+                "tags": [other_tag.id],
+            },
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn("title", res.data[1])
+        self.assertIn("tags", res.data[2])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_create_requires_list(self):
+        """Test the bulk endpoint rejects a single object"""
+        payload = {"title": "Alone", "time_minutes": 5, "price": "1.00"}
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class RecipeImageUploadTest(TestCase):
     def setUp(self):
@@ -233,3 +832,33 @@ class RecipeImageUploadTest(TestCase):
         url = image_upload_url(self.recipe.id)
         res = self.client.post(url, {"image": "not image"}, format="multipart")
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_schedules_variants(self):
+        """Test resizing is queued after commit and URLs are returned"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", (14, 14)).save(ntf, format="JPEG")
+            ntf.seek(0)
+            # run commit hooks straight away, TestCase never commits
+            with patch(
+                "django.db.transaction.on_commit", side_effect=lambda f: f()
+            ), patch("recipe.images.schedule_variants") as schedule:
+                res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        schedule.assert_called_once_with(self.recipe.image.name)
+        self.assertTrue(
+            res.data["image_variants"]["thumbnail"].endswith("thumbnail.jpg")
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100)
+    def test_upload_image_too_many_pixels(self):
+        """Test images over the pixel limit are rejected from the header"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", (14, 14)).save(ntf, format="JPEG")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
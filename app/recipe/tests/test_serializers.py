@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import (
+    IngredientSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
+
+
+class ValuesReadTests(TestCase):
+    """Test the values() read path renders exactly what serializers do"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "values@foobar.com", "pass123"
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=f"Tag {n}")
+            for n in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f"Ing {n}")
+            for n in range(3)
+        ]
+        for index in range(4):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f"Recipe {index}",
+                price="5.50",
+                time_minutes=index,
+                link="" if index % 2 else "https://example.com",
+                image="uploads/recipe/ab/cd/abcd.jpg" if index == 1 else None,
+            )
+            # added out of order, both paths render primary key order
+            recipe.tags.add(*reversed(tags[index % 3:]))
+            recipe.ingredients.add(*ingredients[: index % 3])
+
+    def assertSameOutput(self, serializer_class, queryset, **kwargs):
+        """Assert both paths render byte-identical JSON"""
+        if serializer_class is RecipeSerializer:
+            queryset = queryset.prefetch_related(
+                Prefetch("tags", queryset=Tag.objects.order_by("id")),
+                Prefetch(
+                    "ingredients", queryset=Ingredient.objects.order_by("id")
+                ),
+            )
+        expected = serializer_class(queryset, many=True, **kwargs).data
+        serializer = serializer_class(**kwargs)
+        rows = serializer.read_rows(serializer.read_queryset(queryset))
+
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(rows), renderer.render(expected))
+
+    def test_recipes_match(self):
+        """Test recipe rows match RecipeSerializer output"""
+        self.assertSameOutput(RecipeSerializer, Recipe.objects.order_by("id"))
+
+    def test_sparse_and_expanded_recipes_match(self):
+        """Test narrowed & expanded recipe rows match serializer output"""
+        recipes = Recipe.objects.order_by("id")
+        self.assertSameOutput(
+            RecipeSerializer, recipes, fields=["title", "image_variants"]
+        )
+        self.assertSameOutput(
+            RecipeSerializer, recipes, expand=["tags", "ingredients"]
+        )
+        self.assertSameOutput(
+            RecipeSerializer, recipes, fields=["tags"], expand=["tags"]
+        )
+
+    def test_tags_and_ingredients_match(self):
+        """Test tag & ingredient rows match their serializer output"""
+        self.assertSameOutput(TagSerializer, Tag.objects.order_by("-name"))
+        self.assertSameOutput(
+            IngredientSerializer, Ingredient.objects.order_by("-name")
+        )
+
+    def test_no_rows(self):
+        """Test an empty queryset renders an empty list"""
+        serializer = RecipeSerializer()
+        queryset = serializer.read_queryset(Recipe.objects.none())
+
+        self.assertEqual(serializer.read_rows(queryset), [])
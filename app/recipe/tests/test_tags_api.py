@@ -6,10 +6,11 @@ from rest_framework import status
 
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Tag, Recipe
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse("recipe:tag-list")
+TAGS_BULK_URL = reverse("recipe:tag-bulk-get-or-create")
 
 
 class PublicTagsApiTests(TestCase):
@@ -44,7 +45,7 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_retrieve_tag_of_user_only(self):
         """Test that tags returned are only for the user"""
@@ -57,8 +58,8 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], tag.name)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], tag.name)
 
     def test_create_tag_sucessful(self):
         """Test creating a new tag"""
@@ -76,3 +77,83 @@ class PrivateTagsApiTests(TestCase):
         payload = {"name": ""}
         res = self.client.post(TAGS_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paged in name order with a next cursor"""
+        for name in ("Apple", "Cherry", "Banana"):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+        self.assertEqual(
+            [t["name"] for t in res.data["results"]], ["Cherry", "Banana"]
+        )
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Apple"])
+        self.assertIsNone(res.data["next"])
+
+    def test_retrieve_tags_assigned_to_recipes(self):
+        """Test filtering tags by those assigned to recipes"""
+        tag_1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag_2 = Tag.objects.create(user=self.user, name="Lunch")
+        recipe = Recipe.objects.create(
+            title="Coriander eggs on toast",
+            time_minutes=10,
+            price=5.00,
+            user=self.user,
+        )
+        recipe.tags.add(tag_1)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        names = [item["name"] for item in res.data["results"]]
+        self.assertEqual(names, [tag_1.name])
+        self.assertNotIn(tag_2.name, names)
+
+    def test_retrieve_tags_assigned_unique(self):
+        """Test filtering tags by assigned returns unique items"""
+        tag = Tag.objects.create(user=self.user, name="Breakfast")
+        Tag.objects.create(user=self.user, name="Lunch")
+        for title in ("Pancakes", "Porridge"):
+            recipe = Recipe.objects.create(
+                title=title, time_minutes=5, price=3.00, user=self.user
+            )
+            recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_create_tag_reuses_normalized_name(self):
+        """Test creating a tag that differs only in case returns it"""
+        tag = Tag.objects.create(user=self.user, name="Comfort Food")
+
+        res = self.client.post(TAGS_URL, {"name": "comfort  food"})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["id"], tag.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_get_or_create_tags(self):
+        """Test bulk names are de-duplicated and mapped to IDs"""
+        existing = Tag.objects.create(user=self.user, name="Vegan")
+        payload = {"names": ["vegan", " Dessert", "dessert ", "Quick"]}
+
+        res = self.client.post(TAGS_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["vegan"], existing.id)
+        self.assertEqual(res.data[" Dessert"], res.data["dessert "])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertTrue(
+            Tag.objects.filter(user=self.user, name="Dessert").exists()
+        )
+
+    def test_bulk_get_or_create_tags_invalid(self):
+        """Test blank names are rejected"""
+        payload = {"names": ["Vegan", "   "]}
+
+        res = self.client.post(TAGS_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
@@ -9,4 +9,7 @@ router.register("ingredients", views.IngredientViewSet)
 router.register("recipes", views.RecipeViewSet)
 
 app_name = "recipe"
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("changes/", views.ChangesView.as_view(), name="changes"),
+    path("", include(router.urls)),
+]
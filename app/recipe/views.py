@@ -1,28 +1,161 @@
+import io
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType, ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
 
-from core.models import Ingredient, Recipe, Tag
+from core.models import (
+    Ingredient,
+    Recipe,
+    SyncSequence,
+    Tag,
+    Tombstone,
+    normalize_name,
+)
+from core.search import search_recipes
 from recipe import serializers
+from recipe.imports import RecipeImport
+from recipe.mixins import (
+    CachedListMixin,
+    ConditionalGetMixin,
+    ValuesListMixin,
+)
+from recipe.pagination import (
+    RecipeAttrCursorPagination,
+    RecipeCursorPagination,
+    RecipeSearchPagination,
+)
+from recipe.renderers import CSVRenderer, NDJSONRenderer
+from user.authentication import CachedTokenAuthentication
+
+
+def _query_param(params, name, cast):
+    """Return a query param converted with cast, or None when absent"""
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return cast(value)
+    except (ValueError, ArithmeticError):
+        raise ValidationError({name: f"Invalid value {value!r}."})
+
+
+def _params_to_ints(value):
+    """Convert a comma separated string of IDs to a list of integers"""
+    return [int(str_id) for str_id in value.split(",")]
+
+
+def _finite_decimal(value):
+    """Convert a string to a Decimal, rejecting NaN & infinities"""
+    number = Decimal(value)
+    if not number.is_finite():
+        raise ValueError(f"{value!r} is not a finite number")
+    return number
+
+
+def _params_to_names(value):
+    """Convert a comma separated string to a list of names"""
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def _export_chunks(queryset, chunk_size):
+    """Yield the representations of recipes, chunk_size at a time
+
+    Tags & ingredients load with one query per relation & chunk.
+    """
+    serializer = serializers.RecipeSerializer(expand=("ingredients", "tags"))
+    # in a transaction PostgreSQL streams the server side cursor, instead
+    # of materializing all rows up front to hold it past the commit
+    with transaction.atomic(using=queryset.db):
+        rows = serializer.read_queryset(queryset.order_by("id"))
+        chunk = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield serializer.read_rows(chunk)
+                chunk = []
+        if chunk:
+            yield serializer.read_rows(chunk)
+
+
+def _recipe_relation_exists(relation, **filters):
+    """Return an EXISTS subquery over a recipe M2M through table"""
+    through = getattr(Recipe, relation).through
+    return Exists(through.objects.filter(**filters))
 
 
 class BaseRecipeAttrViewSet(
-    viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin
+    ConditionalGetMixin,
+    CachedListMixin,
+    ValuesListMixin,
+    viewsets.GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
 ):
     """Base view class for recipe attributes (tags & ingredietns)"""
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeAttrCursorPagination
+
+    # name of the Recipe M2M field pointing at this model
+    recipe_field = None
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by("-name")
+        queryset = self.queryset.filter(user=self.request.user)
+        assigned_only = _query_param(
+            self.request.query_params, "assigned_only", int
+        )
+        if self.action == "list" and assigned_only:
+            # EXISTS stops at the first recipe instead of joining & DISTINCT
+            field = Recipe._meta.get_field(self.recipe_field)
+            queryset = queryset.annotate(
+                assigned=_recipe_relation_exists(
+                    self.recipe_field,
+                    **{field.m2m_reverse_field_name(): OuterRef("pk")},
+                )
+            ).filter(assigned=True)
+
+        return queryset.order_by("-name", "id")
+
+    def get_serializer_class(self):
+        """Return correct serializer class for action"""
+        if self.action == "bulk_get_or_create":
+            return serializers.RecipeAttrBulkSerializer
+
+        return self.serializer_class
 
     def perform_create(self, serializer):
-        """Create a new tag"""
-        serializer.save(user=self.request.user)
+        """Create a new tag, reusing one with the same normalized name"""
+        name = serializer.validated_data["name"]
+        found = self.queryset.model.objects.get_or_create_many(
+            self.request.user, [name]
+        )
+        serializer.instance = found[normalize_name(name)]
+
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk_get_or_create(self, request):
+        """Map each posted name to the ID of an existing or new object"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = serializer.validated_data["names"]
+
+        found = self.queryset.model.objects.get_or_create_many(
+            self.request.user, names
+        )
+        return Response(
+            {name: found[normalize_name(name)].id for name in names},
+            status=status.HTTP_200_OK,
+        )
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -30,6 +163,7 @@ class TagViewSet(BaseRecipeAttrViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_field = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -37,18 +171,40 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_field = "ingredients"
 
 
 class RecipeViewSet(
-    viewsets.ModelViewSet
+    ConditionalGetMixin,
+    CachedListMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
 ):  # model view set allows create / update .. not just list
     """Manage Recipes Objects"""
 
     serializer_class = serializers.RecipeSerializer
 
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
+    export_chunk_size = 500
+    # recipes per import transaction, their IDs fit in one SQLite IN list
+    import_batch_size = 500
+    # IDs per batch get, read with a single IN list too
+    batch_get_max_ids = 500
+
+    @property
+    def paginator(self):
+        """Page ranked search results by position instead of by cursor"""
+        if not hasattr(self, "_paginator") and self._search_terms():
+            self._paginator = RecipeSearchPagination()
+        return super().paginator
+
+    def _search_terms(self):
+        if self.action != "list":
+            return ""
+        return self.request.query_params.get("search", "").strip()
 
     def get_serializer_class(self):
         """Return correct serializer class for action"""
@@ -58,16 +214,212 @@ class RecipeViewSet(
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
 
+        elif self.action == "bulk_create":
+            return serializers.RecipeBulkSerializer
+
         return self.serializer_class
 
+    def get_serializer(self, *args, **kwargs):
+        """Narrow & expand the rendered fields as the query asks"""
+        if self.action in ("list", "retrieve"):
+            kwargs["fields"], kwargs["expand"] = self._field_params()
+        return super().get_serializer(*args, **kwargs)
+
+    def _field_params(self):
+        """Return the validated ?fields= (None for all) & ?expand= names"""
+        if not hasattr(self, "_field_names"):
+            params = self.request.query_params
+            serializer_class = self.get_serializer_class()
+            fields = _query_param(params, "fields", _params_to_names)
+            expand = _query_param(params, "expand", _params_to_names) or []
+            for name, names, allowed in (
+                ("fields", fields or [], serializer_class.Meta.fields),
+                ("expand", expand, serializer_class.expandable_fields),
+            ):
+                unknown = [value for value in names if value not in allowed]
+                if unknown:
+                    raise ValidationError(
+                        {name: f"Unknown field {unknown[0]!r}."}
+                    )
+            self._field_names = (fields or None, expand)
+        return self._field_names
+
     def get_queryset(self):
         """Return the receipes of the authenticated user"""
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action == "list":
+            # rendered from values() rows by ValuesListMixin
+            queryset = self._filter_list(queryset)
+        elif self.action == "retrieve":
+            fields, _ = self._field_params()
+            if fields is not None:
+                queryset = queryset.only(*self._columns(fields))
+            # the detail serializer always nests tags & ingredients
+            queryset = self._prefetch_relations(queryset, fields, nest=True)
+        elif self.action == "bulk_create":
+            queryset = self._prefetch_relations(queryset, None, nest=False)
+
+        return queryset
+
+    @staticmethod
+    def _columns(fields):
+        """Return the Recipe columns needed to render the given fields"""
+        field_columns = serializers.RecipeSerializer.field_columns
+        columns = {"id"}
+        for name in fields:
+            if name not in serializers.RecipeSerializer.expandable_fields:
+                columns.add(field_columns.get(name, name))
+        return columns
+
+    def _prefetch_relations(self, queryset, fields, nest):
+        """Prefetch the rendered relations with only the rendered columns"""
+        expandable = serializers.RecipeSerializer.expandable_fields
+        for name, serializer_class in expandable.items():
+            if fields is not None and name not in fields:
+                continue
+            model = Recipe._meta.get_field(name).related_model
+            # without nesting only primary keys are rendered
+            columns = serializer_class.Meta.fields if nest else ["id"]
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    name, queryset=model.objects.only(*columns).order_by("id")
+                )
+            )
+        return queryset
+
+    def _filter_list(self, queryset):
+        """Apply the filters & search of a list call"""
+        params = self.request.query_params
+        for relation in ("tags", "ingredients"):
+            ids = _query_param(params, relation, _params_to_ints)
+            if ids:
+                field = Recipe._meta.get_field(relation)
+                queryset = queryset.annotate(
+                    **{
+                        f"has_{relation}": _recipe_relation_exists(
+                            relation,
+                            recipe=OuterRef("pk"),
+                            **{f"{field.m2m_reverse_field_name()}__in": ids},
+                        )
+                    }
+                ).filter(**{f"has_{relation}": True})
+
+        min_price = _query_param(params, "min_price", _finite_decimal)
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        max_price = _query_param(params, "max_price", _finite_decimal)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+        max_time = _query_param(params, "max_time", int)
+        if max_time is not None:
+            queryset = queryset.filter(time_minutes__lte=max_time)
+        terms = self._search_terms()
+        if terms:
+            queryset = search_recipes(queryset, terms)
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """List recipes, or return those named by ?ids= in detail"""
+        if "ids" in request.query_params:
+            ids = _params_to_names(request.query_params["ids"])
+            return self._batch_get({"ids": ids})
+        return super().list(request, *args, **kwargs)
+
+    @action(methods=["POST"], detail=False, url_path="batch-get")
+    def batch_get(self, request):
+        """Return the recipes listed in the body in detail, for long lists"""
+        return self._batch_get(request.data)
+
+    def _batch_get(self, data):
+        """Return the detail of each requested recipe in request order
+
+        IDs that are not the user's recipes are listed as missing, without
+        telling apart those that do not exist from other users' recipes.
+        """
+        ids = serializers.RecipeIdsSerializer(
+            data=data, context={"max_ids": self.batch_get_max_ids}
+        )
+        ids.is_valid(raise_exception=True)
+        ids = ids.validated_data["ids"]
+
+        queryset = self._prefetch_relations(
+            self.queryset.filter(user=self.request.user, id__in=ids),
+            None,
+            nest=True,
+        )
+        found = {recipe.id: recipe for recipe in queryset}
+        recipes = [found[pk] for pk in ids if pk in found]
+        output = serializers.RecipeDetailSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return Response(
+            {
+                "results": output.data,
+                "missing": [pk for pk in ids if pk not in found],
+            }
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return a recipe, or 304 if the client's copy is current"""
+        try:
+            last_modified = (
+                self.queryset.filter(user=request.user, pk=kwargs["pk"])
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except ValueError:
+            last_modified = None
+        if last_modified is None:
+            # unknown recipe, let the regular lookup return the 404
+            return super().retrieve(request, *args, **kwargs)
+
+        return self.conditional_response(
+            request,
+            last_modified,
+            kwargs["pk"],
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
 
     def perform_create(self, serializer):
         """Create a new recipe"""
         return serializer.save(user=self.request.user)
 
+    @action(
+        methods=["GET"],
+        detail=False,
+        renderer_classes=(NDJSONRenderer, CSVRenderer),
+    )
+    def export(self, request):
+        """Stream all the user's recipes as NDJSON or CSV (?format=)"""
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(
+                _export_chunks(self.get_queryset(), self.export_chunk_size)
+            ),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="recipes.{renderer.format}"'
+        )
+        return response
+
+    @action(
+        methods=["POST"], detail=False, url_path="import", url_name="import"
+    )
+    def import_recipes(self, request):
+        """Create recipes from an NDJSON body, read a line at a time"""
+        media_type = request.content_type.split(";")[0].strip()
+        if media_type != NDJSONRenderer.media_type:
+            raise UnsupportedMediaType(request.content_type)
+
+        # the raw stream, DRF's parsers would read the whole body
+        stream = request.stream or io.BytesIO()
+        summary = RecipeImport(request, self.import_batch_size).run(stream)
+        return Response(summary, status=status.HTTP_200_OK)
+
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
@@ -78,3 +430,86 @@ class RecipeViewSet(
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk_create(self, request):
+        """Create many recipes from a list in a single transaction"""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(user=self.request.user)
+
+        created = self.get_queryset().filter(id__in=[r.id for r in recipes])
+        output = serializers.RecipeSerializer(
+            created.order_by("id"), many=True
+        )
+        return Response(output.data, status=status.HTTP_201_CREATED)
+
+
+class ChangesView(APIView):
+    """List the user's objects changed or deleted since a cursor (?since=)
+
+    Changes are ordered by the user's sequence, deletions are read from
+    tombstones. A page ends between two sequence numbers, so it can run
+    over page_size by the rows of one change. The returned cursor is the
+    since of the next call, more says whether it has changes waiting.
+    """
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    page_size = 500
+
+    # response key -> model & serializer of the changed objects
+    sources = {
+        "tags": (Tag, serializers.TagSerializer),
+        "ingredients": (Ingredient, serializers.IngredientSerializer),
+        "recipes": (Recipe, serializers.RecipeSerializer),
+    }
+
+    def get(self, request):
+        since = _query_param(request.query_params, "since", int) or 0
+        if since < 0:
+            raise ValidationError({"since": f"Invalid value {since!r}."})
+        # changes numbered up to the counter have all committed, later
+        # ones may still be in flight
+        current = SyncSequence.objects.current_value(request.user.pk)
+        changed = {
+            key: model.objects.filter(
+                user=request.user,
+                sync_sequence__gt=since,
+                sync_sequence__lte=current,
+            ).order_by("sync_sequence", "id")
+            for key, (model, _) in self.sources.items()
+        }
+        changed["deleted"] = Tombstone.objects.filter(
+            user=request.user,
+            sync_sequence__gt=since,
+            sync_sequence__lte=current,
+        ).order_by("sync_sequence", "id")
+
+        # the first page_size numbers of each kind find the page's end
+        limit = self.page_size + 1
+        numbers = {
+            key: list(queryset.values_list("sync_sequence", flat=True)[:limit])
+            for key, queryset in changed.items()
+        }
+        merged = sorted(n for found in numbers.values() for n in found)
+        cursor = current
+        if len(merged) > self.page_size:
+            cursor = merged[self.page_size - 1]
+
+        data = {"cursor": cursor, "more": cursor < current}
+        for key, (_, serializer_class) in self.sources.items():
+            data[key] = []
+            if numbers[key] and numbers[key][0] <= cursor:
+                serializer = serializer_class()
+                rows = serializer.read_queryset(
+                    changed[key].filter(sync_sequence__lte=cursor)
+                )
+                data[key] = serializer.read_rows(rows)
+        data["deleted"] = {key: [] for key in self.sources}
+        if numbers["deleted"] and numbers["deleted"][0] <= cursor:
+            tombstones = changed["deleted"].filter(sync_sequence__lte=cursor)
+            for kind, object_id in tombstones.values_list("kind", "object_id"):
+                data["deleted"][f"{kind}s"].append(object_id)
+
+        return Response(data)
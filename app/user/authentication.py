@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_KEY = "auth-token:{}"
+# enough to authorize and run every view, the rest is loaded on access
+SNAPSHOT_FIELDS = (
+    "id",
+    "is_superuser",
+    "email",
+    "name",
+    "is_active",
+    "is_staff",
+)
+
+
+class LocalLRUCache:
+    """Thread safe, size bounded in-process cache with a per-entry TTL"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TokenCache:
+    """Two level token key -> user snapshot cache with hit rate counters"""
+
+    def __init__(self):
+        self.local = LocalLRUCache(
+            settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+            settings.AUTH_TOKEN_LOCAL_CACHE_TTL,
+        )
+        self.counts = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def get(self, key):
+        """Return the cached snapshot for a token key, or None"""
+        snapshot = self.local.get(key)
+        if snapshot is not None:
+            self.counts["local_hits"] += 1
+            return snapshot
+
+        snapshot = cache.get(TOKEN_CACHE_KEY.format(key))
+        if snapshot is not None:
+            self.counts["shared_hits"] += 1
+            self.local.set(key, snapshot)
+            return snapshot
+
+        self.counts["misses"] += 1
+        return None
+
+    def set(self, key, snapshot):
+        cache.set(
+            TOKEN_CACHE_KEY.format(key),
+            snapshot,
+            settings.AUTH_TOKEN_CACHE_TTL,
+        )
+        self.local.set(key, snapshot)
+
+    def invalidate(self, *keys):
+        """Drop token keys from both levels"""
+        cache.delete_many([TOKEN_CACHE_KEY.format(key) for key in keys])
+        for key in keys:
+            self.local.delete(key)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token of a user"""
+        keys = list(
+            Token.objects.filter(user_id=user_id).values_list("key", flat=True)
+        )
+        if keys:
+            self.invalidate(*keys)
+
+    def stats(self):
+        """Return the hit counters and the overall hit rate"""
+        lookups = sum(self.counts.values())
+        hits = lookups - self.counts["misses"]
+        return dict(self.counts, hit_rate=hits / lookups if lookups else 0.0)
+
+
+token_cache = TokenCache()
+
+
+def access_token_expiry(token):
+    """Return when an access token stops being accepted"""
+    return token.created + timedelta(seconds=settings.AUTH_ACCESS_TOKEN_TTL)
+
+
+def issue_access_token(user):
+    """Return the user's access token, replacing it once expired"""
+    token, created = Token.objects.get_or_create(user=user)
+    if created or access_token_expiry(token) > timezone.now():
+        return token
+
+    token.delete()
+    try:
+        with transaction.atomic():
+            return Token.objects.create(user=user)
+    except IntegrityError:
+        # a concurrent refresh already issued the replacement
+        return Token.objects.get(user=user)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token/user query when cached"""
+
+    def authenticate_credentials(self, key):
+        user_model = get_user_model()
+        entry = token_cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            expires = access_token_expiry(token).timestamp()
+            if expires <= time.time():
+                raise exceptions.AuthenticationFailed(_("Token has expired."))
+            snapshot = tuple(getattr(user, name) for name in SNAPSHOT_FIELDS)
+            token_cache.set(key, (expires, snapshot))
+            return (user, token)
+
+        expires, snapshot = entry
+        if expires <= time.time():
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+
+        # fields outside the snapshot are deferred, so they load on access
+        # and save() only writes the fields that were loaded or assigned
+        user = user_model.from_db(
+            router.db_for_read(user_model), SNAPSHOT_FIELDS, snapshot
+        )
+        return (user, Token(key=key, user=user))
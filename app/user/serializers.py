@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import ugettext_lazy as _
 
+from django.utils import timezone
+
 from rest_framework import serializers
 
+from core.models import RefreshToken
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the users object"""
@@ -12,6 +16,16 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ("email", "password", "name")
         extra_kwargs = {"password": {"write_only": True, "min_length": 5}}
 
+    def validate_email(self, value):
+        """Reject emails taken by another user in any letter case"""
+        users = get_user_model().objects.filter(email__iexact=value)
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            msg = _("A user with that email already exists.")
+            raise serializers.ValidationError(msg, code="unique")
+        return value
+
     def create(self, validated_data):
         """create a new user with encrypted password and return it"""
         return get_user_model().objects.create_user(**validated_data)
@@ -53,3 +67,24 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer exchanging a refresh token for an access token"""
+
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        """Validate the refresh token without touching the password"""
+        token = (
+            RefreshToken.objects.select_related("user")
+            .filter(key=attrs.get("refresh"), expires_at__gt=timezone.now())
+            .first()
+        )
+
+        if token is None or not token.user.is_active:
+            msg = _("Invalid or expired refresh token")
+            raise serializers.ValidationError(msg, code="authentication")
+
+        attrs["user"] = token.user
+        return attrs
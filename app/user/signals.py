@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.models import RefreshToken
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token straight away"""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def user_saving(sender, instance, **kwargs):
+    """Note a password change, set_password() state is reset by save()
+
+    Login rehashing the same password with a newer hasher isn't one.
+    """
+    raw = getattr(instance, "_password", None)
+    instance._password_changed = False
+    if raw is not None and instance.pk is not None:
+        stored = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("password", flat=True)
+            .first()
+        )
+        instance._password_changed = not (
+            stored and check_password(raw, stored)
+        )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """Refresh cached snapshots on password, is_active or profile changes
+
+    A new password revokes the user's access & refresh tokens, so stolen
+    ones stop working & every client signs in again.
+    """
+    if created:
+        return
+    if instance._password_changed:
+        RefreshToken.objects.filter(user=instance).delete()
+        # token_deleted drops each from the cache
+        Token.objects.filter(user=instance).delete()
+    token_cache.invalidate_user(instance.pk)
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from user.authentication import CachedTokenAuthentication, token_cache
+
+ME_URL = reverse("user:me")
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the cached token authentication class"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.local.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@foobar.com", password="pass123", name="test person"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_cached_lookup_skips_database(self):
+        """Test a repeated token lookup runs no queries"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, self.user.email)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_shared_cache_hit_after_local_expiry(self):
+        """Test the shared cache answers when the local copy is gone"""
+        self.auth.authenticate_credentials(self.token.key)
+        token_cache.local.clear()
+        hits = token_cache.counts["shared_hits"]
+
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(token_cache.counts["shared_hits"], hits + 1)
+        self.assertGreater(token_cache.stats()["hit_rate"], 0)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops authenticating"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user drops their cached snapshot"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_update_profile_with_cached_user(self):
+        """Test updating /me/ with a cached user keeps other fields intact"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        client.get(ME_URL)
+
+        res = client.patch(ME_URL, {"name": "new name"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("pass123"))
+
+        res = client.patch(ME_URL, {"password": "newpass123"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, "new name")
+        self.assertTrue(self.user.check_password("newpass123"))
+        # the new password revoked the cached token
+        res = client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,12 +1,20 @@
+from datetime import timedelta
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import RefreshToken
+
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token")
+REFRESH_URL = reverse("user:token-refresh")
 ME_URL = reverse("user:me")
 
 
@@ -44,6 +52,20 @@ class PublicUserApiTests(TestCase):
         res = self.client.post(CREATE_USER_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_user_email_case_duplicate_fails(self):
+        """Test emails differing only in letter case are duplicates"""
+        create_user(email="test@foobar.com", password="testpass")
+        payload = {
+            "email": "Test@FOOBAR.com",
+            "password": "testpass",
+            "name": "test Name",
+        }
+
+        res = self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", res.data)
+
     def test_min_length_password(self):
         """Test that password is at least minimun length (5 char)"""
         payload = {
@@ -67,6 +89,16 @@ class PublicUserApiTests(TestCase):
         self.assertIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_email_any_case(self):
+        """Test logging in ignores the letter case of the email"""
+        create_user(email="test@foobar.com", password="pass123")
+        payload = {"email": "TEST@foobar.com", "password": "pass123"}
+
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("token", res.data)
+
     def test_create_token_invalid_creds(self):
         """Test that token is not created when provided invalid creds"""
         create_user(email="test@foobar.com", password="pass123")
@@ -90,6 +122,109 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertNotIn("token", res.data)
 
+    def test_create_token_returns_refresh_token(self):
+        """Test logging in returns an expiring access & a refresh token"""
+        payload = {"email": "test@foobar.com", "password": "pass123"}
+        create_user(**payload)
+
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(RefreshToken.objects.filter(key=res.data["refresh"]))
+        self.assertGreater(res.data["expires_in"], 0)
+
+    @patch("user.serializers.authenticate")
+    def test_refresh_token_skips_password_check(self, authenticate):
+        """Test refreshing issues an access token without authenticate()"""
+        user = create_user(email="test@foobar.com", password="pass123")
+        refresh = RefreshToken.objects.create(user=user)
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh.key})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["token"], Token.objects.get(user=user).key)
+        authenticate.assert_not_called()
+
+    def test_refresh_replaces_expired_access_token(self):
+        """Test an expired access token is rotated on refresh"""
+        user = create_user(email="test@foobar.com", password="pass123")
+        old = Token.objects.create(user=user)
+        Token.objects.filter(pk=old.pk).update(
+            created=timezone.now() - timedelta(days=1)
+        )
+        refresh = RefreshToken.objects.create(user=user)
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh.key})
+
+        self.assertNotEqual(res.data["token"], old.key)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {old.key}")
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_token_expired(self):
+        """Test an expired refresh token is rejected"""
+        user = create_user(email="test@foobar.com", password="pass123")
+        refresh = RefreshToken.objects.create(
+            user=user, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh.key})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn("token", res.data)
+
+    def test_expired_access_token_rejected(self):
+        """Test requests with an expired access token are unauthorized"""
+        user = create_user(email="test@foobar.com", password="pass123")
+        token = Token.objects.create(user=user)
+        Token.objects.filter(pk=token.pk).update(
+            created=timezone.now() - timedelta(days=1)
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_tokens(self):
+        """Test a new password stops the old access & refresh tokens"""
+        payload = {"email": "test@foobar.com", "password": "pass123"}
+        create_user(**payload)
+        tokens = self.client.post(TOKEN_URL, payload).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {tokens['token']}")
+
+        res = self.client.patch(ME_URL, {"password": "newpass123"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(REFRESH_URL, {"refresh": tokens["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_profile_change_keeps_tokens(self):
+        """Test saving a user without a new password keeps its tokens"""
+        payload = {"email": "test@foobar.com", "password": "pass123"}
+        create_user(**payload)
+        tokens = self.client.post(TOKEN_URL, payload).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {tokens['token']}")
+
+        res = self.client.patch(ME_URL, {"name": "New name"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+        res = self.client.post(REFRESH_URL, {"refresh": tokens["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_password_rehash_keeps_tokens(self):
+        """Test upgrading the hash of the same password keeps tokens"""
+        user = create_user(email="test@foobar.com", password="pass123")
+        refresh = RefreshToken.objects.create(user=user)
+
+        user.set_password("pass123")
+        user.save(update_fields=["password"])
+
+        self.assertTrue(RefreshToken.objects.filter(pk=refresh.pk).exists())
+
     def test_auth_required_manage_profile(self):
         """Test that authentication is required on an enpoint"""
         res = self.client.get(ME_URL)
@@ -1,9 +1,28 @@
-from rest_framework import generics, authentication, permissions
+from django.utils import timezone
+
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.models import RefreshToken
+from user.authentication import (
+    CachedTokenAuthentication,
+    access_token_expiry,
+    issue_access_token,
+)
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    RefreshTokenSerializer,
+)
+
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+def access_token_data(user):
+    """Return the response body for a freshly issued access token"""
+    token = issue_access_token(user)
+    expires_in = access_token_expiry(token) - timezone.now()
+    return {"token": token.key, "expires_in": int(expires_in.total_seconds())}
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -18,12 +37,34 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """Check the password once, then hand out access & refresh tokens"""
+        serializer = self.serializer_class(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+
+        refresh = RefreshToken.objects.create(user=user)
+        return Response(dict(access_token_data(user), refresh=refresh.key))
+
+
+class RefreshTokenView(CreateTokenView):
+    """Exchange a refresh token for a new access token"""
+
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(access_token_data(serializer.validated_data["user"]))
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
 
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):